@@ -1,11 +1,87 @@
-from zai import ZaiClient
+from lm_cassette import create_zai_client
 from dotenv import load_dotenv
 import os
 import json
+import uuid
+from collections import deque
 from debug_config import DebugConfig, debug_print
 
 load_dotenv()
 
+
+class ContextBuffer:
+    """
+    Contexto reciente de la conversación con tamaño fijo
+    
+    Se actualiza en O(1) cada vez que el agente agrega un mensaje al historial,
+    así las decisiones de DSPy no tienen que recorrer el historial en cada turno.
+    """
+    
+    def __init__(self, max_messages: int = 3, max_chars: int = 100):
+        self.max_chars = max_chars
+        self.messages = deque(maxlen=max_messages)
+        self.last_tool = None
+        self.last_tool_result = None
+        self._since_tool = 0  # Mensajes agregados desde la última herramienta
+        self._rendered = None
+    
+    def add(self, message: dict):
+        """Agrega un mensaje del historial al contexto"""
+        role = message.get('role', 'unknown')
+        content = message.get('content')
+        
+        if role == 'system':
+            return
+        
+        if role == 'tool':
+            self.last_tool = message.get('name', 'unknown')
+            self.last_tool_result = self._summarize_tool_result(content)
+            self.messages.append(f"tool {self.last_tool}: {self.last_tool_result}")
+            self._since_tool = 0
+        elif content:
+            self.messages.append(f"{role}: {content[:self.max_chars]}")
+            self._since_tool += 1
+        else:
+            return
+        
+        self._rendered = None
+    
+    def _summarize_tool_result(self, content) -> str:
+        """Resume el resultado de una herramienta (éxito o error)"""
+        try:
+            result = json.loads(content) if isinstance(content, str) else content
+        except (TypeError, ValueError):
+            return str(content)[:self.max_chars]
+        
+        if isinstance(result, dict) and 'success' in result:
+            if result['success']:
+                detail = result.get('message', 'ok')
+                return f"ok - {str(detail)[:self.max_chars]}"
+            return f"error - {str(result.get('error', 'desconocido'))[:self.max_chars]}"
+        return str(result)[:self.max_chars]
+    
+    def render(self) -> str:
+        """Devuelve el contexto como texto (cacheado hasta el siguiente cambio)"""
+        if not self.messages:
+            return "Sin contexto previo"
+        
+        if self._rendered is None:
+            parts = list(self.messages)
+            # Conservar la última herramienta aunque ya salió de la ventana
+            if self.last_tool and self._since_tool >= len(self.messages):
+                parts.insert(0, f"última herramienta: {self.last_tool} ({self.last_tool_result})")
+            self._rendered = " | ".join(parts)
+        return self._rendered
+    
+    def clear(self):
+        """Limpia el contexto"""
+        self.messages.clear()
+        self.last_tool = None
+        self.last_tool_result = None
+        self._since_tool = 0
+        self._rendered = None
+
+
 class Agent:
     """Clase para crear y gestionar agentes personalizados con Z.AI"""
     
@@ -15,7 +91,10 @@ class Agent:
         self.model = model
         self.tools = tools or []  # Lista de herramientas disponibles
         self.conversation_history = []
-        self.client = ZaiClient(api_key=os.getenv("ZAI_API_KEY"))
+        self.context_buffer = ContextBuffer()
+        self.client = create_zai_client()
+        # Sesión del pool de navegadores: cada instancia conserva su propio navegador
+        self.browser_session = f"{name}-{uuid.uuid4().hex[:8]}"
         
         # Generar instrucciones completas con información de herramientas
         full_instructions = self._build_instructions_with_tools(instructions)
@@ -27,11 +106,16 @@ class Agent:
             debug_print("=" * 70)
         
         # Inicializar con las instrucciones del sistema
-        self.conversation_history.append({
+        self._append_message({
             "role": "system",
             "content": full_instructions
         })
     
+    def _append_message(self, message: dict):
+        """Agrega un mensaje al historial y actualiza el contexto reciente"""
+        self.conversation_history.append(message)
+        self.context_buffer.add(message)
+    
     def _build_instructions_with_tools(self, base_instructions: str) -> str:
         """Construye instrucciones completas incluyendo información de herramientas"""
         if not self.tools:
@@ -81,7 +165,8 @@ class Agent:
                     if func_name == 'task_list':
                         tools_info += f"• TASK_LIST: Lista SOLO TUS tareas asignadas a '{self.name}'.\n"
                         tools_info += f"  ⚠️ IMPORTANTE: Úsala PRIMERO cuando el usuario diga 'realiza tus tareas' o 'tienes tareas pendientes'.\n"
-                        tools_info += f"  💡 Automáticamente filtra solo tus tareas (no necesitas pasar parámetros).\n"
+                        tools_info += f"  💡 Automáticamente filtra solo tus tareas. Por defecto muestra las pendientes;\n"
+                        tools_info += f"     usa status, query o cursor (next_cursor) solo si necesitas más.\n"
                     elif func_name == 'task_add':
                         tools_info += "• TASK_ADD: Agrega una nueva tarea.\n"
                     elif func_name == 'task_complete':
@@ -89,6 +174,10 @@ class Agent:
                         tools_info += "  Úsala DESPUÉS de completar cada tarea.\n"
                     elif func_name == 'task_delete':
                         tools_info += "• TASK_DELETE: Elimina una tarea.\n"
+                    elif func_name == 'task_add_batch':
+                        tools_info += "• TASK_ADD_BATCH: Agrega varias tareas en una sola llamada.\n"
+                    elif func_name == 'task_complete_batch':
+                        tools_info += "• TASK_COMPLETE_BATCH: Marca varias tareas como completadas en una sola llamada.\n"
                 tools_info += "\n"
         
         tools_info += "IMPORTANTE: Usa las herramientas apropiadas según la tarea. Si no estás seguro, pregunta al usuario."
@@ -113,7 +202,7 @@ class Agent:
         debug_print(f"Usuario: {message}", "show_tool_calls")
         
         # Agregar mensaje del usuario al historial
-        self.conversation_history.append({
+        self._append_message({
             "role": "user",
             "content": message
         })
@@ -155,7 +244,7 @@ class Agent:
                             raise  # Último intento falló, propagar error
                 
                 # Agregar respuesta del asistente al historial
-                self.conversation_history.append({
+                self._append_message({
                     "role": "assistant",
                     "content": response_message.content,
                     "tool_calls": getattr(response_message, 'tool_calls', None)
@@ -188,7 +277,7 @@ class Agent:
                         debug_print(f"   Resultado: {function_response}")
                     
                     # Agregar resultado al historial
-                    self.conversation_history.append({
+                    self._append_message({
                         "role": "tool",
                         "tool_call_id": tool_call.id,
                         "name": function_name,
@@ -225,30 +314,38 @@ class Agent:
             # Selenium - Navegación
             elif function_name == 'selenium_navigate':
                 from selenium_handler import selenium_navigate
-                return selenium_navigate(arguments.get('url'))
+                return selenium_navigate(arguments.get('url'), session_id=self.browser_session)
             
             # Selenium - Obtener texto
             elif function_name == 'selenium_get_text':
                 from selenium_handler import selenium_get_text
-                return selenium_get_text()
+                return selenium_get_text(session_id=self.browser_session)
             
             # Selenium - Buscar elemento
             elif function_name == 'selenium_find_text':
                 from selenium_handler import selenium_find_text
                 return selenium_find_text(
                     arguments.get('selector'),
-                    arguments.get('by', 'css')
+                    arguments.get('by', 'css'),
+                    session_id=self.browser_session
                 )
             
             # Selenium - Captura de pantalla
             elif function_name == 'selenium_screenshot':
                 from selenium_handler import selenium_screenshot
-                return selenium_screenshot(arguments.get('filename', 'screenshot.png'))
+                return selenium_screenshot(arguments.get('filename', 'screenshot.png'),
+                                           session_id=self.browser_session)
             
             # Tareas - Agregar
             elif function_name == 'task_add':
                 from task_manager import task_add
-                return task_add(arguments.get('description'))
+                return task_add(
+                    arguments.get('description'),
+                    priority=arguments.get('priority', 0),
+                    due_at=arguments.get('due_at'),
+                    recurrence=arguments.get('recurrence'),
+                    depends_on=arguments.get('depends_on')
+                )
             
             # Tareas - Completar
             elif function_name == 'task_complete':
@@ -259,13 +356,30 @@ class Agent:
             elif function_name == 'task_list':
                 from task_manager import task_list
                 # SIEMPRE usar el nombre del agente (self.name), ignorar lo que pase el modelo
-                return task_list(agent_name=self.name)
+                return task_list(
+                    agent_name=self.name,
+                    status=arguments.get('status', 'pending'),
+                    limit=arguments.get('limit', 20),
+                    cursor=arguments.get('cursor'),
+                    query=arguments.get('query'),
+                    verbose=arguments.get('verbose', False)
+                )
             
             # Tareas - Eliminar
             elif function_name == 'task_delete':
                 from task_manager import task_delete
                 return task_delete(arguments.get('task_id'))
             
+            # Tareas - Agregar varias
+            elif function_name == 'task_add_batch':
+                from task_manager import task_add_batch
+                return task_add_batch(arguments.get('descriptions'))
+            
+            # Tareas - Completar varias
+            elif function_name == 'task_complete_batch':
+                from task_manager import task_complete_batch
+                return task_complete_batch(arguments.get('task_ids'))
+            
             # Web Search - Z.AI maneja esto automáticamente
             # No necesitamos ejecutarlo manualmente
             elif function_name == 'web_search':
@@ -305,7 +419,7 @@ class Agent:
         debug_print(f"[STREAM] Usuario: {message}", "show_tool_calls")
         
         # Agregar mensaje del usuario al historial
-        self.conversation_history.append({
+        self._append_message({
             "role": "user",
             "content": message
         })
@@ -337,7 +451,7 @@ class Agent:
                     yield content
             
             # Agregar respuesta completa al historial
-            self.conversation_history.append({
+            self._append_message({
                 "role": "assistant",
                 "content": full_response
             })
@@ -351,6 +465,7 @@ class Agent:
             "role": "system",
             "content": self.instructions
         }]
+        self.context_buffer.clear()
     
     def get_history(self) -> list:
         """Obtiene el historial completo de la conversación"""
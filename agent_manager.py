@@ -9,7 +9,9 @@ from utils import LoadingIndicator
 from tools import create_web_search_tool, create_code_interpreter_tool, get_available_tools, create_task_tools
 from dspy_agent import DSPyAgent
 from debug_config import DebugConfig, DebugLevel
-from task_manager import TaskManager
+from task_manager import get_task_manager
+from task_worker import TaskWorkerPool
+from task_archive import TaskArchive
 import os
 import json
 from pathlib import Path
@@ -467,9 +469,10 @@ class AgentManager:
     
     def manage_tasks(self):
         """Gestionar tareas y asignarlas a agentes"""
-        task_manager = TaskManager()
-        
         while True:
+            # Instancia compartida; se recarga si otro proceso modificó las tareas
+            task_manager = get_task_manager()
+            
             print("\n" + "=" * 70)
             print("  GESTIÓN DE TAREAS")
             print("=" * 70)
@@ -488,8 +491,9 @@ class AgentManager:
             print("4. Asignar tarea a un agente")
             print("5. Marcar tarea como completada")
             print("6. Eliminar tarea")
-            print("7. Limpiar tareas completadas")
-            print("8. Volver al menú principal")
+            print("7. Archivar tareas completadas")
+            print("8. Ejecutar tareas asignadas (modo autónomo)")
+            print("9. Volver al menú principal")
             
             choice = input("\nSelecciona una opción: ").strip()
             
@@ -539,8 +543,19 @@ class AgentManager:
                 # Crear nueva tarea
                 description = input("\nDescripción de la tarea: ").strip()
                 if description:
-                    task = task_manager.add_task(description)
-                    print(f"✓ Tarea #{task.id} creada: {description}")
+                    priority = input("Prioridad (Enter = 0): ").strip()
+                    due_at = input("Vencimiento (ISO o +30m/+1d, Enter = sin fecha): ").strip()
+                    recurrence = input("Repetir cada (1h/1d/weekly, Enter = no): ").strip()
+                    try:
+                        task = task_manager.add_task(
+                            description,
+                            priority=int(priority) if priority else 0,
+                            due_at=due_at or None,
+                            recurrence=recurrence or None
+                        )
+                        print(f"✓ Tarea #{task.id} creada: {description}")
+                    except ValueError as e:
+                        print(f"⚠️  Programación inválida: {e}")
                 else:
                     print("⚠️  Descripción vacía, tarea no creada")
             
@@ -692,19 +707,39 @@ class AgentManager:
                     print("⚠️  ID inválido")
             
             elif choice == '7':
-                # Limpiar completadas
+                # Archivar completadas (se pueden consultar con python task_archive.py search)
                 completed = task_manager.get_completed_tasks()
                 if not completed:
-                    print("\n⚠️  No hay tareas completadas para limpiar")
+                    print("\n⚠️  No hay tareas completadas para archivar")
                     continue
                 
-                print(f"\n⚠️  Se eliminarán {len(completed)} tareas completadas")
-                confirm = input("¿Confirmar? (s/n): ").strip().lower()
-                if confirm == 's':
-                    task_manager.clear_completed()
-                    print("✓ Tareas completadas eliminadas")
+                default_age = os.getenv('TASKS_ARCHIVE_AFTER', '')
+                older_than = input(f"\nArchivar completadas hace más de (ej: 7d, Enter = "
+                                   f"{default_age or 'todas'}): ").strip() or default_age or None
+                archive = TaskArchive(os.getenv('TASKS_ARCHIVE_DIR', 'tasks_archive'))
+                try:
+                    count = task_manager.archive_completed(archive, older_than=older_than)
+                except ValueError as e:
+                    print(f"⚠️  {e}")
+                    continue
+                print(f"📦 {count} tareas archivadas en {archive.archive_dir}")
             
             elif choice == '8':
+                # Ejecutar en paralelo, sin interacción, las tareas asignadas
+                workers = input("\nTrabajadores en paralelo (Enter = 4): ").strip()
+                try:
+                    pool = TaskWorkerPool(
+                        workers=int(workers) if workers else 4,
+                        agents_dir=str(self.agents_dir)
+                    )
+                except ValueError:
+                    print("⚠️  Número inválido")
+                    continue
+                results = pool.run()
+                if results:
+                    pool.print_report(results)
+            
+            elif choice == '9':
                 break
             
             else:
@@ -7,8 +7,11 @@ from typing import List, Dict, Optional
 import os
 from dotenv import load_dotenv
 import json
+import re
+import unicodedata
 import warnings
 from debug_config import DebugConfig, debug_print
+from lm_cassette import get_cassette
 
 # Suprimir warnings de DSPy
 warnings.filterwarnings('ignore', module='dspy')
@@ -20,6 +23,60 @@ logging.getLogger('dspy').setLevel(logging.ERROR)
 
 load_dotenv()
 
+# Programa compilado offline (ver dspy_compiler.py)
+DEFAULT_PROGRAM_PATH = os.getenv('DSPY_PROGRAM_PATH', 'dspy_program.json')
+
+
+class CassetteLM(dspy.LM):
+    """LM de DSPy que graba o reproduce sus llamadas con un cassette"""
+    
+    # Parámetros que no forman parte de la clave de la solicitud
+    IGNORED_KWARGS = ('api_key', 'api_base', 'cache')
+    
+    def __init__(self, *args, cassette=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cassette = cassette
+    
+    def forward(self, prompt=None, messages=None, **kwargs):
+        request = {'source': 'dspy', 'model': self.model, 'prompt': prompt, 'messages': messages}
+        request.update({
+            k: v for k, v in {**self.kwargs, **kwargs}.items()
+            if k not in self.IGNORED_KWARGS
+        })
+        
+        data = self.cassette.play(
+            request,
+            lambda: super(CassetteLM, self).forward(prompt=prompt, messages=messages, **kwargs)
+        )
+        
+        from litellm import ModelResponse
+        response = ModelResponse(**data)
+        
+        # Al reproducir no pasa por dspy.LM.forward: registrar el uso manualmente
+        if self.cassette.mode == 'replay' and dspy.settings.usage_tracker and data.get('usage'):
+            dspy.settings.usage_tracker.add_usage(self.model, dict(data['usage']))
+        return response
+
+
+def create_lm(cache: bool = True):
+    """
+    Crea el LM de DSPy para Z.AI (con cassette si LM_CASSETTE_MODE está activo)
+    
+    Args:
+        cache: Caché de respuestas de DSPy (desactivarla al medir latencia y costo)
+    """
+    params = {
+        'model': 'openai/glm-4.6',
+        'api_base': 'https://api.z.ai/api/paas/v4',
+        'api_key': os.getenv('ZAI_API_KEY'),
+        'cache': cache
+    }
+    
+    cassette = get_cassette()
+    if cassette:
+        return CassetteLM(cassette=cassette, **params)
+    return dspy.LM(**params)
+
 
 class ToolDecider(dspy.Signature):
     """Decide si se debe usar una herramienta y cuál"""
@@ -38,6 +95,7 @@ class ToolExecutor(dspy.Module):
     
     def __init__(self, use_examples: bool = True):
         super().__init__()
+        self.compiled = False
         
         if use_examples:
             # Usar ChainOfThoughtWithHint para incluir ejemplos
@@ -56,14 +114,42 @@ class ToolExecutor(dspy.Module):
             self.examples = []
             print("⚠️  No se pudieron cargar ejemplos")
     
-    def forward(self, user_query: str, available_tools, context: str = ""):
+    def load_compiled(self, path: str = DEFAULT_PROGRAM_PATH) -> bool:
+        """
+        Carga un programa compilado offline (demos e instrucciones)
+        
+        Args:
+            path: Archivo generado por dspy_compiler.py
+            
+        Returns:
+            True si se cargó el programa
+        """
+        if not path or not os.path.exists(path):
+            return False
+        
+        try:
+            self.load(path)
+            # Programas guardados antes guardaban el contexto de las demos como 'context'
+            for predictor in self.predictors():
+                for demo in predictor.demos:
+                    if 'context' in demo and 'conversation_context' not in demo:
+                        demo['conversation_context'] = demo['context']
+            self.compiled = True
+            print(f"✓ Programa DSPy compilado cargado: {path}")
+            return True
+        except Exception as e:
+            print(f"⚠️  No se pudo cargar el programa compilado: {e}")
+            return False
+    
+    def forward(self, user_query: str, available_tools, conversation_context: str = ""):
         """
         Decide si usar una herramienta y cuál
         
         Args:
             user_query: Pregunta del usuario
             available_tools: Lista de herramientas disponibles o string
-            context: Contexto de la conversación
+            conversation_context: Contexto de la conversación (mismo nombre que en la firma
+                y en los ejemplos, así las demos compiladas lo conservan)
             
         Returns:
             Decisión sobre qué herramienta usar
@@ -78,7 +164,7 @@ class ToolExecutor(dspy.Module):
         decision = self.decide_tool(
             user_query=user_query,
             available_tools=tools_desc,
-            conversation_context=context or "Sin contexto previo"
+            conversation_context=conversation_context or "Sin contexto previo"
         )
         
         return {
@@ -114,35 +200,129 @@ class ToolExecutor(dspy.Module):
         return "\n".join(formatted)
 
 
+class IntentFilter:
+    """
+    Pre-filtro barato que detecta mensajes que obviamente no requieren herramientas
+    
+    Saludos, agradecimientos y pedidos de aclaración como "explica más" se
+    responden sin llamar al decisor de DSPy ni enviar herramientas al modelo.
+    """
+    
+    # Frases completas que nunca requieren herramientas (texto normalizado).
+    # Confirmaciones como "sí" u "ok" no se incluyen: pueden aprobar una herramienta.
+    # Tampoco seguimientos como "continua" o "dame más detalles": pueden retomar la
+    # última herramienta (seguir navegando, ampliar una búsqueda).
+    TRIVIAL_PATTERNS = [
+        r"(hola|hey|hi|hello|buenas|buenos dias|buenas tardes|buenas noches|que tal|como estas)",
+        r"(muchas )?(gracias|thanks|thank you|te lo agradezco)( por todo| por tu ayuda)?",
+        r"(perfecto|genial|excelente|entendido)",
+        r"(adios|hasta luego|nos vemos|bye|chao)",
+        r"(explica|explicame|explicalo) (mas|mejor|de nuevo|otra vez)",
+    ]
+    
+    # Palabras que sugieren una herramienta: nunca se omite el decisor
+    TOOL_KEYWORDS = [
+        'busca', 'precio', 'noticia', 'hoy', 'actual', 'envia', 'enviame', 'mensaje',
+        'telegram', 'notifica', 'tarea', 'pendiente', 'navega', 'pagina', 'http', 'www',
+        'captura', 'calcula', 'codigo', 'grafico', 'imagen', 'dibuja',
+    ]
+    
+    def __init__(self, enabled: bool = True, min_length: int = 2, max_length: int = 40,
+                 patterns: List[str] = None, tool_keywords: List[str] = None, classifier=None):
+        """
+        Args:
+            enabled: Si False, nunca se omite el decisor
+            min_length: Mensajes más cortos que esto se consideran triviales
+            max_length: Mensajes más largos que esto siempre pasan al decisor
+            patterns: Expresiones regulares de frases triviales (reemplaza las de por defecto)
+            tool_keywords: Palabras que obligan a usar el decisor (reemplaza las de por defecto)
+            classifier: Función opcional (mensaje) -> bool, True si no requiere herramientas
+        """
+        self.enabled = enabled
+        self.min_length = min_length
+        self.max_length = max_length
+        self.tool_keywords = tool_keywords or self.TOOL_KEYWORDS
+        self.classifier = classifier
+        self._pattern = re.compile(
+            "|".join(f"(?:{p})" for p in (patterns or self.TRIVIAL_PATTERNS))
+        )
+        self.total = 0
+        self.bypassed = 0
+    
+    @staticmethod
+    def _normalize(message: str) -> str:
+        """Minúsculas, sin acentos ni puntuación"""
+        text = unicodedata.normalize('NFKD', message.lower())
+        text = ''.join(c for c in text if not unicodedata.combining(c))
+        text = re.sub(r"[^\w\s]", " ", text)
+        return " ".join(text.split())
+    
+    def is_tool_free(self, message: str) -> bool:
+        """Decide si el mensaje puede responderse sin herramientas"""
+        if not self.enabled:
+            return False
+        
+        self.total += 1
+        text = self._normalize(message)
+        
+        if len(text) > self.max_length or any(k in text for k in self.tool_keywords):
+            tool_free = False
+        elif len(text) < self.min_length or self._pattern.fullmatch(text):
+            tool_free = True
+        elif self.classifier:
+            tool_free = bool(self.classifier(message))
+        else:
+            tool_free = False
+        
+        if tool_free:
+            self.bypassed += 1
+        return tool_free
+    
+    def get_stats(self) -> dict:
+        """Obtiene la tasa de mensajes que omitieron el decisor"""
+        return {
+            'total': self.total,
+            'bypassed': self.bypassed,
+            'bypass_rate': (self.bypassed / self.total * 100) if self.total > 0 else 0
+        }
+
+
 class DSPyAgent:
     """Agente mejorado con DSPy para mejor toma de decisiones"""
     
-    def __init__(self, base_agent, debug: bool = False):
+    def __init__(self, base_agent, debug: bool = False, program_path: str = DEFAULT_PROGRAM_PATH,
+                 intent_filter: IntentFilter = None, tool_executor: ToolExecutor = None):
         """
         Inicializa el agente DSPy
         
         Args:
             base_agent: Instancia del agente base (Agent)
             debug: Si True, muestra las decisiones de DSPy
+            program_path: Programa compilado offline a cargar (si existe)
+            intent_filter: Pre-filtro de mensajes sin herramientas (IntentFilter() por defecto)
+            tool_executor: Ejecutor ya creado y compartido entre agentes; DSPy debe estar
+                configurado (desde hilos secundarios dspy.configure falla)
         """
         self.base_agent = base_agent
         self.debug = debug
+        self.intent_filter = intent_filter or IntentFilter()
+        
+        if tool_executor is not None:
+            self.tool_executor = tool_executor
+            return
         
         # Configurar DSPy con Z.AI
         self._configure_dspy()
         
         # Crear ejecutor de herramientas
         self.tool_executor = ToolExecutor()
+        self.tool_executor.load_compiled(program_path)
     
     def _configure_dspy(self):
         """Configura DSPy para usar Z.AI"""
         try:
             # Configurar LM con OpenAI-compatible API
-            lm = dspy.LM(
-                model='openai/glm-4.6',
-                api_base='https://api.z.ai/api/paas/v4',
-                api_key=os.getenv('ZAI_API_KEY')
-            )
+            lm = create_lm()
             dspy.configure(lm=lm)
             print("✓ DSPy configurado con Z.AI")
         except Exception as e:
@@ -164,6 +344,14 @@ class DSPyAgent:
         if not self.base_agent.get_tools():
             return self.base_agent.chat(message, **kwargs)
         
+        # Pre-filtro: saludos, agradecimientos, etc. van directo sin herramientas
+        if self.intent_filter.is_tool_free(message):
+            if self.debug or DebugConfig.show_dspy_decisions:
+                stats = self.intent_filter.get_stats()
+                print(f"\n⚡ Pre-filtro: sin herramientas "
+                      f"(omitidos {stats['bypassed']}/{stats['total']}, {stats['bypass_rate']:.1f}%)\n")
+            return self.base_agent.chat(message, **{**kwargs, 'use_tools': False})
+        
         try:
             # Obtener contexto de la conversación
             context = self._get_context()
@@ -172,7 +360,7 @@ class DSPyAgent:
             decision = self.tool_executor(
                 user_query=message,
                 available_tools=self.base_agent.get_tools(),
-                context=context
+                conversation_context=context
             )
             
             # Mostrar decisión si debug está activo o si self.debug=True
@@ -190,21 +378,8 @@ class DSPyAgent:
             return self.base_agent.chat(message, **kwargs)
     
     def _get_context(self) -> str:
-        """Obtiene el contexto de la conversación"""
-        history = self.base_agent.get_history()
-        if len(history) <= 1:
-            return "Sin contexto previo"
-        
-        # Obtener últimos 3 mensajes
-        recent = history[-3:]
-        context_parts = []
-        for msg in recent:
-            role = msg.get('role', 'unknown')
-            content = msg.get('content', '')
-            if content:
-                context_parts.append(f"{role}: {content[:100]}")
-        
-        return " | ".join(context_parts)
+        """Obtiene el contexto de la conversación (buffer incremental del agente)"""
+        return self.base_agent.context_buffer.render()
     
     def __getattr__(self, name):
         """Delega atributos no encontrados al agente base"""
@@ -0,0 +1,148 @@
+"""
+Analítica de decisiones de herramientas
+Matriz de confusión herramienta×herramienta y precisión/recall/F1 por herramienta
+"""
+
+import csv
+import json
+import sys
+import numpy as np
+
+# Etiqueta para resultados que fallaron antes de predecir una herramienta
+ERROR_LABEL = "<error>"
+
+
+def load_results(path: str) -> list:
+    """
+    Carga resultados desde un JSONL (archivo de ejecución del evaluador o decisiones registradas)
+
+    Cada línea puede ser un registro del evaluador ({'result': {...}}) o el resultado directo.
+    """
+    results = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            results.append(record.get('result', record))
+    return results
+
+
+class ToolConfusion:
+    """Matriz de confusión de herramientas (filas = esperada, columnas = predicha)"""
+
+    def __init__(self, expected, predicted):
+        """
+        Args:
+            expected: Secuencia de herramientas esperadas
+            predicted: Secuencia de herramientas predichas (mismo orden)
+        """
+        expected = np.asarray(expected, dtype=object).astype(str)
+        predicted = np.asarray(predicted, dtype=object).astype(str)
+
+        # Codificar etiquetas y contar todas las parejas de una vez
+        self.labels, codes = np.unique(np.concatenate([expected, predicted]), return_inverse=True)
+        n = len(self.labels)
+        exp_idx, pred_idx = codes[:len(expected)], codes[len(expected):]
+        self.matrix = np.bincount(exp_idx * n + pred_idx, minlength=n * n).reshape(n, n)
+
+    @classmethod
+    def from_results(cls, results):
+        """Crea la matriz desde los resultados de DSPyEvaluator"""
+        expected = [str(r.get('expected_tool') or 'none').strip() for r in results]
+        predicted = [
+            ERROR_LABEL if 'error' in r else str(r.get('predicted_tool') or 'none').strip()
+            for r in results
+        ]
+        return cls(expected, predicted)
+
+    def per_tool(self) -> dict:
+        """
+        Métricas por herramienta
+
+        Returns:
+            dict {herramienta: {'precision', 'recall', 'f1', 'support'}}
+        """
+        tp = np.diag(self.matrix).astype(float)
+        predicted_totals = self.matrix.sum(axis=0)
+        support = self.matrix.sum(axis=1)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            precision = np.where(predicted_totals > 0, tp / predicted_totals, 0.0)
+            recall = np.where(support > 0, tp / support, 0.0)
+            f1 = np.where(precision + recall > 0, 2 * precision * recall / (precision + recall), 0.0)
+
+        return {
+            str(label): {
+                'precision': float(precision[i]),
+                'recall': float(recall[i]),
+                'f1': float(f1[i]),
+                'support': int(support[i])
+            }
+            for i, label in enumerate(self.labels)
+        }
+
+    def accuracy(self) -> float:
+        """Proporción de herramientas correctas"""
+        total = self.matrix.sum()
+        return float(np.trace(self.matrix) / total) if total else 0.0
+
+    def top_confusions(self, k: int = 10) -> list:
+        """Las k parejas (esperada, predicha, cantidad) más frecuentes fuera de la diagonal"""
+        off_diagonal = self.matrix.copy()
+        np.fill_diagonal(off_diagonal, 0)
+        flat = np.argsort(off_diagonal, axis=None)[::-1][:k]
+        rows, cols = np.unravel_index(flat, off_diagonal.shape)
+        return [
+            (str(self.labels[r]), str(self.labels[c]), int(off_diagonal[r, c]))
+            for r, c in zip(rows, cols) if off_diagonal[r, c] > 0
+        ]
+
+    def to_csv(self, path: str):
+        """Exporta la matriz de confusión a CSV"""
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['esperada\\predicha'] + [str(label) for label in self.labels])
+            for label, row in zip(self.labels, self.matrix):
+                writer.writerow([str(label)] + [int(v) for v in row])
+
+    def to_json(self, path: str):
+        """Exporta matriz y métricas por herramienta a JSON"""
+        data = {
+            'labels': [str(label) for label in self.labels],
+            'matrix': self.matrix.tolist(),
+            'accuracy': self.accuracy(),
+            'per_tool': self.per_tool()
+        }
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+
+    def print_report(self, top: int = 10):
+        """Imprime métricas por herramienta y las confusiones más frecuentes"""
+        print(f"\n🧮 Métricas por Herramienta ({int(self.matrix.sum())} decisiones):")
+        print(f"   {'Herramienta':<24} {'Precisión':>10} {'Recall':>8} {'F1':>6} {'Soporte':>8}")
+        for tool, m in self.per_tool().items():
+            print(f"   {tool:<24} {m['precision']:>10.2f} {m['recall']:>8.2f} "
+                  f"{m['f1']:>6.2f} {m['support']:>8}")
+
+        confusions = self.top_confusions(top)
+        if confusions:
+            print(f"\n🔀 Confusiones más frecuentes:")
+            for expected, predicted, count in confusions:
+                print(f"   {expected} → {predicted}: {count}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Uso: python dspy_analytics.py <resultados.jsonl> [prefijo_salida]")
+        sys.exit(1)
+
+    confusion = ToolConfusion.from_results(load_results(sys.argv[1]))
+    print(f"Precisión (Herramienta): {confusion.accuracy() * 100:.1f}%")
+    confusion.print_report()
+
+    if len(sys.argv) > 2:
+        confusion.to_csv(f"{sys.argv[2]}_confusion.csv")
+        confusion.to_json(f"{sys.argv[2]}_confusion.json")
+        print(f"\n✓ Exportado a {sys.argv[2]}_confusion.csv y {sys.argv[2]}_confusion.json")
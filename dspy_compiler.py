@@ -0,0 +1,114 @@
+"""
+Compilador offline de DSPy
+Optimiza el ToolExecutor con los ejemplos de entrenamiento y guarda el programa
+"""
+
+import dspy
+import os
+from dotenv import load_dotenv
+from dspy_agent import ToolExecutor, DEFAULT_PROGRAM_PATH, create_lm
+
+load_dotenv()
+
+
+def _expected_use(example) -> str:
+    """Obtiene la decisión esperada ('yes'/'no') de un ejemplo"""
+    expected = example.get('should_use_tool')
+    if expected:
+        return expected.lower()
+    # Algunos ejemplos solo definen tool_name
+    return 'no' if example.tool_name == 'none' else 'yes'
+
+
+def tool_decision_metric(example, prediction, trace=None) -> bool:
+    """
+    Métrica de DSPy: la decisión y la herramienta deben coincidir
+
+    Args:
+        example: Ejemplo esperado
+        prediction: Resultado de ToolExecutor (dict)
+        trace: Traza de DSPy (no usada)
+
+    Returns:
+        True si la decisión es correcta
+    """
+    predicted_use = 'yes' if prediction['should_use_tool'] else 'no'
+    correct_tool = prediction['tool_name'].strip() == example.tool_name
+    return correct_tool and predicted_use == _expected_use(example)
+
+
+def build_trainset(examples) -> list:
+    """
+    Adapta los ejemplos a los argumentos de ToolExecutor.forward
+
+    Se conserva 'conversation_context' (campo de la firma): las demos
+    etiquetadas se guardan con esas claves y el predictor las vuelve a usar.
+    """
+    trainset = []
+    for ex in examples:
+        trainset.append(dspy.Example(
+            user_query=ex.user_query,
+            available_tools=ex.available_tools,
+            conversation_context=ex.get('conversation_context') or "Sin contexto previo",
+            should_use_tool=_expected_use(ex),
+            tool_name=ex.tool_name,
+            reasoning=ex.get('reasoning', '')
+        ).with_inputs("user_query", "available_tools", "conversation_context"))
+    return trainset
+
+
+def compile_tool_executor(examples=None, output_path: str = DEFAULT_PROGRAM_PATH,
+                          max_bootstrapped_demos: int = 4, max_labeled_demos: int = 8) -> ToolExecutor:
+    """
+    Compila el ToolExecutor con BootstrapFewShot y guarda el resultado
+
+    Args:
+        examples: Ejemplos de entrenamiento (usa ALL_EXAMPLES por defecto)
+        output_path: Archivo donde guardar el programa optimizado
+        max_bootstrapped_demos: Máximo de demos generadas por el teacher
+        max_labeled_demos: Máximo de demos tomadas directamente de los ejemplos
+
+    Returns:
+        ToolExecutor compilado
+    """
+    if examples is None:
+        from dspy_examples import ALL_EXAMPLES
+        examples = ALL_EXAMPLES
+
+    trainset = build_trainset(examples)
+    print(f"🔧 Compilando ToolExecutor con {len(trainset)} ejemplos...")
+
+    optimizer = dspy.BootstrapFewShot(
+        metric=tool_decision_metric,
+        max_bootstrapped_demos=max_bootstrapped_demos,
+        max_labeled_demos=max_labeled_demos
+    )
+    compiled = optimizer.compile(ToolExecutor(use_examples=False), trainset=trainset)
+
+    # Guarda demos e instrucciones de cada predictor en JSON
+    compiled.save(output_path)
+    print(f"✓ Programa compilado guardado en: {output_path}")
+
+    return compiled
+
+
+def main():
+    """Compila y guarda el programa usando Z.AI"""
+    print("=" * 70)
+    print("  COMPILACIÓN OFFLINE DE DSPY")
+    print("=" * 70)
+
+    try:
+        lm = create_lm()
+        dspy.configure(lm=lm)
+        print("\n✓ DSPy configurado correctamente\n")
+    except Exception as e:
+        print(f"\n❌ Error configurando DSPy: {e}\n")
+        return
+
+    output_path = os.getenv('DSPY_PROGRAM_PATH', DEFAULT_PROGRAM_PATH)
+    compile_tool_executor(output_path=output_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+Datasets de ejemplos DSPy en archivos JSONL
+Carga perezosa (stream), muestreo, subconjuntos estratificados por herramienta y shards
+
+Formato (una línea por ejemplo):
+    {"user_query": "...", "available_tools": "...", "conversation_context": "...",
+     "should_use_tool": "yes", "tool_name": "web_search", "reasoning": "..."}
+"""
+
+import glob
+import gzip
+import json
+import random
+from pathlib import Path
+from typing import Iterable, Iterator, List
+import dspy
+
+INPUT_FIELDS = ("user_query", "available_tools", "conversation_context")
+EXAMPLE_FIELDS = INPUT_FIELDS + ("should_use_tool", "tool_name", "reasoning")
+
+
+def _expand_paths(source: str) -> List[Path]:
+    """Acepta un archivo, un directorio (*.jsonl, *.jsonl.gz) o un patrón glob"""
+    path = Path(source)
+    if path.is_dir():
+        files = sorted(path.glob("*.jsonl")) + sorted(path.glob("*.jsonl.gz"))
+    else:
+        files = [Path(p) for p in sorted(glob.glob(source))]
+    if not files:
+        raise FileNotFoundError(f"No se encontraron datasets en: {source}")
+    return files
+
+
+def _open(path: Path):
+    """Abre archivos JSONL, comprimidos o no"""
+    if path.suffix == ".gz":
+        return gzip.open(path, "rt", encoding="utf-8")
+    return open(path, "r", encoding="utf-8")
+
+
+def example_from_dict(data: dict) -> dspy.Example:
+    """Crea un ejemplo DSPy desde un registro JSONL"""
+    fields = {k: data[k] for k in EXAMPLE_FIELDS if k in data}
+    fields.setdefault("conversation_context", "Sin contexto previo")
+    if "should_use_tool" not in fields and "tool_name" in fields:
+        fields["should_use_tool"] = "no" if fields["tool_name"] == "none" else "yes"
+    return dspy.Example(**fields).with_inputs(*INPUT_FIELDS)
+
+
+def example_to_dict(example) -> dict:
+    """Convierte un ejemplo DSPy a registro JSONL"""
+    return {k: example.get(k) for k in EXAMPLE_FIELDS if example.get(k) is not None}
+
+
+def iter_examples(source: str) -> Iterator[dspy.Example]:
+    """
+    Lee ejemplos de uno o varios archivos JSONL sin cargarlos en memoria
+
+    Args:
+        source: Archivo, directorio o patrón glob (ej: "logs/*.jsonl.gz")
+
+    Yields:
+        dspy.Example por cada línea válida
+    """
+    for path in _expand_paths(source):
+        with _open(path) as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield example_from_dict(json.loads(line))
+                except (ValueError, KeyError) as e:
+                    print(f"⚠️  Línea inválida en {path}: {e}")
+
+
+def write_examples(examples: Iterable, path: str) -> int:
+    """
+    Guarda ejemplos en un archivo JSONL (ej: para exportar dspy_examples.py)
+
+    Returns:
+        Número de ejemplos escritos
+    """
+    count = 0
+    opener = gzip.open if str(path).endswith(".gz") else open
+    with opener(path, "wt", encoding="utf-8") as f:
+        for example in examples:
+            f.write(json.dumps(example_to_dict(example), ensure_ascii=False) + "\n")
+            count += 1
+    return count
+
+
+def sample(examples: Iterable, k: int, seed: int = 0) -> list:
+    """Muestra aleatoria de k ejemplos de un stream (reservoir sampling)"""
+    rng = random.Random(seed)
+    reservoir = []
+    for i, example in enumerate(examples):
+        if i < k:
+            reservoir.append(example)
+        else:
+            j = rng.randint(0, i)
+            if j < k:
+                reservoir[j] = example
+    return reservoir
+
+
+def stratified_sample(examples: Iterable, per_tool: int, seed: int = 0) -> list:
+    """
+    Hasta per_tool ejemplos por herramienta esperada (tool_name), en un solo recorrido
+
+    Returns:
+        Lista ordenada por herramienta
+    """
+    rng = random.Random(seed)
+    reservoirs = {}
+    seen = {}
+    for example in examples:
+        tool = example.get("tool_name", "none")
+        bucket = reservoirs.setdefault(tool, [])
+        seen[tool] = seen.get(tool, 0) + 1
+        if len(bucket) < per_tool:
+            bucket.append(example)
+        else:
+            j = rng.randint(0, seen[tool] - 1)
+            if j < per_tool:
+                bucket[j] = example
+    return [example for tool in sorted(reservoirs) for example in reservoirs[tool]]
+
+
+def shard(examples: Iterable, index: int, count: int) -> Iterator:
+    """
+    Reparte un stream entre procesos: devuelve los ejemplos i con i % count == index
+
+    Args:
+        index: Número de shard (0..count-1)
+        count: Total de shards
+    """
+    if not 0 <= index < count:
+        raise ValueError(f"Shard inválido: {index}/{count}")
+    for i, example in enumerate(examples):
+        if i % count == index:
+            yield example
+
+
+if __name__ == "__main__":
+    # Exporta los ejemplos incluidos en dspy_examples.py
+    from dspy_examples import ALL_EXAMPLES
+
+    written = write_examples(ALL_EXAMPLES, "dspy_examples.jsonl")
+    print(f"✓ {written} ejemplos guardados en dspy_examples.jsonl")
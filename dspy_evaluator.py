@@ -3,22 +3,133 @@ Evaluador de DSPy - Verifica que las decisiones sean correctas
 """
 
 import dspy
-from dspy_agent import ToolExecutor, DSPyAgent
+from dspy.utils.usage_tracker import track_usage
+from dspy_agent import ToolExecutor, ToolDecider, DSPyAgent, create_lm
 from dspy_examples import ALL_EXAMPLES, get_examples_by_tool
+from dspy_dataset import iter_examples, shard
+from dspy_analytics import ToolConfusion
 from agent_creator import Agent
 from tools import create_web_search_tool, create_telegram_tool, create_code_interpreter_tool
+from utils import RateLimiter
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from pathlib import Path
+import hashlib
+import json
+import math
+import threading
+import time
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
 
+def percentile(values, pct: float) -> float:
+    """Percentil por rango más cercano (0 si no hay valores)"""
+    if not values:
+        return 0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
 class DSPyEvaluator:
     """Evalúa la precisión de las decisiones de DSPy"""
     
-    def __init__(self):
-        self.tool_executor = ToolExecutor(use_examples=True)
+    # Precios de glm-4.6 en USD por millón de tokens
+    PROMPT_PRICE_PER_M = 0.6
+    COMPLETION_PRICE_PER_M = 2.2
+    
+    # Errores listados individualmente en el reporte
+    MAX_ERRORS_SHOWN = 20
+    
+    def __init__(self, workers: int = 8, requests_per_second: float = None, run_file: str = None,
+                 prompt_price_per_m: float = None, completion_price_per_m: float = None,
+                 tool_executor=None):
+        """
+        Args:
+            workers: Número de ejemplos evaluados en paralelo
+            requests_per_second: Límite de llamadas al LM (None = sin límite)
+            run_file: Archivo JSONL donde se guarda cada resultado (permite reanudar)
+            prompt_price_per_m: USD por millón de tokens de entrada
+            completion_price_per_m: USD por millón de tokens de salida
+            tool_executor: Programa a evaluar (ToolExecutor con ejemplos por defecto). Puede ser
+                cualquier función (user_query, available_tools, context) -> decisión
+        """
+        self.prompt_price_per_m = prompt_price_per_m if prompt_price_per_m is not None else self.PROMPT_PRICE_PER_M
+        self.completion_price_per_m = (completion_price_per_m if completion_price_per_m is not None
+                                       else self.COMPLETION_PRICE_PER_M)
+        self.tool_executor = tool_executor or ToolExecutor(use_examples=True)
         self.results = []
+        self.workers = max(1, workers)
+        self.rate_limiter = RateLimiter(requests_per_second) if requests_per_second else None
+        self.run_file = Path(run_file) if run_file else None
+        self.program_version = self._program_version()
+        self._run_lock = threading.Lock()
+        if getattr(dspy.settings.lm, 'cache', False):
+            print("⚠️  El LM configurado usa caché: latencia, tokens y costo no serán reales "
+                  "(usa create_lm(cache=False))")
+    
+    def _program_version(self) -> str:
+        """
+        Hash del programa evaluado (instrucciones y demos)
+        
+        Sin dump_state() solo se conoce el nombre del programa: state_versioned
+        queda en False y la versión no distingue, por ejemplo, dos lambdas.
+        """
+        try:
+            state = self.tool_executor.dump_state()
+            self.state_versioned = True
+        except Exception:
+            state = {}
+            self.state_versioned = False
+        executor = self.tool_executor
+        name = getattr(executor, '__qualname__', type(executor).__qualname__)
+        payload = json.dumps([ToolDecider.__doc__, name, state], sort_keys=True, default=str)
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:12]
+    
+    @staticmethod
+    def example_hash(example) -> str:
+        """Hash estable de las entradas y etiquetas de un ejemplo"""
+        fields = ['user_query', 'available_tools', 'conversation_context',
+                  'should_use_tool', 'tool_name']
+        payload = json.dumps({f: example.get(f) for f in fields}, sort_keys=True)
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:16]
+    
+    def load_run(self) -> dict:
+        """
+        Carga los resultados ya guardados para la versión actual del programa
+        
+        Returns:
+            dict {example_hash: resultado}
+        """
+        done = {}
+        if not self.run_file or not self.run_file.exists():
+            return done
+        
+        with open(self.run_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # Línea incompleta de una ejecución interrumpida
+                if record.get('program_version') == self.program_version:
+                    done[record['example_hash']] = record['result']
+        return done
+    
+    def _save_result(self, key: str, result: dict):
+        """Agrega un resultado al archivo de la ejecución"""
+        if not self.run_file or 'error' in result:
+            return  # Los errores se reintentan en la siguiente ejecución
+        
+        record = {
+            'example_hash': key,
+            'program_version': self.program_version,
+            'result': result
+        }
+        with self._run_lock:
+            with open(self.run_file, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
     
     def evaluate_example(self, example):
         """
@@ -38,7 +149,7 @@ class DSPyEvaluator:
         decision = self.tool_executor(
             user_query=example.user_query,
             available_tools=example.available_tools,  # Pasar como string
-            context=example.conversation_context
+            conversation_context=example.conversation_context
         )
         
         # Comparar con la respuesta esperada
@@ -74,61 +185,130 @@ class DSPyEvaluator:
         """
         if examples is None:
             examples = ALL_EXAMPLES
+        examples = list(examples)  # Acepta streams de dspy_dataset
         
         print("=" * 70)
         print("  EVALUACIÓN DE DSPY")
         print("=" * 70)
         print(f"\nEvaluando {len(examples)} ejemplos...\n")
         
-        self.results = []
-        correct_tools = 0
-        correct_decisions = 0
+        total = len(examples)
+        keys = [self.example_hash(example) for example in examples]
         
-        for i, example in enumerate(examples, 1):
-            print(f"[{i}/{len(examples)}] Evaluando: {example.user_query[:50]}...")
-            
-            try:
-                result = self.evaluate_example(example)
-                self.results.append(result)
-                
-                if result['correct_tool']:
-                    correct_tools += 1
-                if result['correct_decision']:
-                    correct_decisions += 1
-                
-                # Mostrar si hay error
-                if not result['correct_tool'] or not result['correct_decision']:
-                    print(f"    ❌ Error:")
-                    print(f"       Esperado: {result['expected_tool']}")
-                    print(f"       Obtenido: {result['predicted_tool']}")
-                else:
-                    print(f"    ✅ Correcto")
-                    
-            except Exception as e:
-                print(f"    ⚠️  Error: {e}")
-                self.results.append({
-                    'query': example.user_query,
-                    'error': str(e),
-                    'correct_tool': False,
-                    'correct_decision': False
-                })
+        # Reanudar: los ejemplos ya evaluados se toman del archivo
+        saved = self.load_run()
+        results = [saved.get(key) for key in keys]
+        pending = [i for i, r in enumerate(results) if r is None]
+        if saved:
+            print(f"↻ {total - len(pending)} ejemplos ya evaluados en {self.run_file}\n")
+        
+        # Evaluar en paralelo; los resultados conservan el orden de los ejemplos
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = {
+                pool.submit(self._evaluate_limited, examples[i]): i
+                for i in pending
+            }
+            for done, future in enumerate(as_completed(futures), 1):
+                i = futures[future]
+                results[i] = future.result()
+                self._save_result(keys[i], results[i])
+                self._print_progress(done, len(pending), results[i])
+        
+        return self._build_metrics(results)
+    
+    def metrics_from_run(self, examples=None):
+        """
+        Reconstruye las métricas desde el archivo de la ejecución, sin llamar al LM
+        
+        Args:
+            examples: Ejemplos del reporte (todos los del archivo por defecto)
+        """
+        saved = self.load_run()
+        if examples is None:
+            results = list(saved.values())
+        else:
+            results = [saved[key] for key in map(self.example_hash, examples) if key in saved]
+        return self._build_metrics(results)
+    
+    def _build_metrics(self, results):
+        """Calcula las métricas de un conjunto de resultados"""
+        self.results = results
+        total = len(results)
+        correct_tools = sum(1 for r in results if r['correct_tool'])
+        correct_decisions = sum(1 for r in results if r['correct_decision'])
         
         # Calcular métricas
-        total = len(examples)
         accuracy_tool = (correct_tools / total * 100) if total > 0 else 0
         accuracy_decision = (correct_decisions / total * 100) if total > 0 else 0
         
+        # Latencia y costo (los resultados antiguos pueden no tener estos campos)
+        latencies = [r['latency'] for r in results if 'latency' in r]
+        prompt_tokens = sum(r.get('prompt_tokens', 0) for r in results)
+        completion_tokens = sum(r.get('completion_tokens', 0) for r in results)
+        total_cost = (prompt_tokens * self.prompt_price_per_m +
+                      completion_tokens * self.completion_price_per_m) / 1_000_000
+        
         metrics = {
             'total_examples': total,
             'correct_tools': correct_tools,
             'correct_decisions': correct_decisions,
             'accuracy_tool': accuracy_tool,
             'accuracy_decision': accuracy_decision,
+            'latency_p50': percentile(latencies, 50),
+            'latency_p95': percentile(latencies, 95),
+            'latency_p99': percentile(latencies, 99),
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'tokens_per_decision': (prompt_tokens + completion_tokens) / total if total > 0 else 0,
+            'retries': sum(r.get('retries', 0) for r in results),
+            'total_cost': total_cost,
+            'cost_per_correct': total_cost / correct_decisions if correct_decisions > 0 else 0,
             'results': self.results
         }
         
         return metrics
     
+    def _evaluate_limited(self, example):
+        """Evalúa un ejemplo respetando el límite de peticiones y mide latencia y tokens"""
+        if self.rate_limiter:
+            self.rate_limiter.acquire()
+        
+        start = time.perf_counter()
+        with track_usage() as tracker:
+            try:
+                result = self.evaluate_example(example)
+            except Exception as e:
+                # Conservar lo esperado: la matriz de confusión cuenta el error en su herramienta
+                result = {
+                    'query': example.user_query,
+                    'expected_tool': example.tool_name,
+                    'expected_use': example.should_use_tool,
+                    'error': str(e),
+                    'correct_tool': False,
+                    'correct_decision': False
+                }
+        result['latency'] = time.perf_counter() - start
+        
+        # Una entrada por llamada al LM; las llamadas extra son reintentos del adapter
+        calls = [usage for entries in tracker.usage_data.values() for usage in entries]
+        result['prompt_tokens'] = sum(u.get('prompt_tokens') or 0 for u in calls)
+        result['completion_tokens'] = sum(u.get('completion_tokens') or 0 for u in calls)
+        result['retries'] = max(0, len(calls) - 1)
+        return result
+    
+    def _print_progress(self, done: int, total: int, result: dict):
+        """Muestra el resultado de un ejemplo a medida que termina"""
+        print(f"[{done}/{total}] Evaluado: {result['query'][:50]}...")
+        
+        if 'error' in result:
+            print(f"    ⚠️  Error: {result['error']}")
+        elif not result['correct_tool'] or not result['correct_decision']:
+            print(f"    ❌ Error:")
+            print(f"       Esperado: {result['expected_tool']}")
+            print(f"       Obtenido: {result['predicted_tool']}")
+        else:
+            print(f"    ✅ Correcto")
+    
     def print_report(self, metrics):
         """Imprime un reporte detallado de la evaluación"""
         print("\n" + "=" * 70)
@@ -142,16 +322,30 @@ class DSPyEvaluator:
         print(f"\n   🎯 Precisión (Herramienta): {metrics['accuracy_tool']:.1f}%")
         print(f"   🎯 Precisión (Decisión): {metrics['accuracy_decision']:.1f}%")
         
-        # Mostrar errores
+        print(f"\n⏱️  Latencia y Costo:")
+        print(f"   Latencia p50/p95/p99: {metrics['latency_p50']:.2f}s / "
+              f"{metrics['latency_p95']:.2f}s / {metrics['latency_p99']:.2f}s")
+        print(f"   Tokens por decisión: {metrics['tokens_per_decision']:.0f} "
+              f"({metrics['prompt_tokens']} entrada, {metrics['completion_tokens']} salida)")
+        print(f"   Reintentos: {metrics['retries']}")
+        print(f"   Costo total: ${metrics['total_cost']:.4f} | "
+              f"Costo por decisión correcta: ${metrics['cost_per_correct']:.5f}")
+        
+        # Matriz de confusión y métricas por herramienta
+        ToolConfusion.from_results(metrics['results']).print_report()
+        
+        # Mostrar errores (los primeros; el resto se ve en la matriz de confusión)
         errors = [r for r in metrics['results'] if not r.get('correct_tool', True)]
         if errors:
             print(f"\n❌ Errores ({len(errors)}):")
-            for err in errors:
+            for err in errors[:self.MAX_ERRORS_SHOWN]:
                 print(f"\n   Query: {err['query']}")
                 print(f"   Esperado: {err.get('expected_tool', 'N/A')}")
                 print(f"   Obtenido: {err.get('predicted_tool', 'N/A')}")
                 if 'error' in err:
                     print(f"   Error: {err['error']}")
+            if len(errors) > self.MAX_ERRORS_SHOWN:
+                print(f"\n   ... y {len(errors) - self.MAX_ERRORS_SHOWN} errores más")
         
         # Evaluación final
         print("\n" + "=" * 70)
@@ -176,13 +370,177 @@ class DSPyEvaluator:
         print("  EVALUACIÓN POR CATEGORÍA")
         print("=" * 70)
         
+        by_category = {}
         for category, examples in categories.items():
             if not examples:
                 continue
                 
             print(f"\n### {category.upper()}")
             metrics = self.evaluate_all(examples)
+            by_category[category] = metrics
             print(f"   Precisión: {metrics['accuracy_tool']:.1f}%")
+        
+        # Resumen comparativo por categoría
+        print("\n" + "-" * 70)
+        print(f"{'Categoría':<12} {'Precisión':>10} {'p50':>7} {'p95':>7} {'p99':>7} "
+              f"{'Tokens':>8} {'$/correcta':>11}")
+        for category, m in by_category.items():
+            print(f"{category:<12} {m['accuracy_tool']:>9.1f}% {m['latency_p50']:>6.2f}s "
+                  f"{m['latency_p95']:>6.2f}s {m['latency_p99']:>6.2f}s "
+                  f"{m['tokens_per_decision']:>8.0f} {m['cost_per_correct']:>11.5f}")
+        print("-" * 70)
+        
+        return by_category
+
+
+def paired_difference(a, b, z: float = 1.96) -> dict:
+    """
+    Diferencia pareada de aciertos (b - a) con intervalo de confianza normal
+
+    Args:
+        a: Lista de aciertos (bool) del programa A
+        b: Lista de aciertos (bool) del programa B, mismo orden
+        z: Valor z del intervalo (1.96 = 95%)
+    """
+    n = len(a)
+    if n == 0:
+        return {'diff': 0, 'ci_low': 0, 'ci_high': 0, 'b_wins': 0, 'a_wins': 0}
+    
+    diffs = [int(y) - int(x) for x, y in zip(a, b)]
+    mean = sum(diffs) / n
+    variance = sum((d - mean) ** 2 for d in diffs) / (n - 1) if n > 1 else 0
+    margin = z * math.sqrt(variance / n)
+    
+    return {
+        'diff': mean * 100,
+        'ci_low': (mean - margin) * 100,
+        'ci_high': (mean + margin) * 100,
+        'b_wins': diffs.count(1),
+        'a_wins': diffs.count(-1)
+    }
+
+
+class ABComparison:
+    """
+    Compara dos programas de decisión sobre los mismos ejemplos
+    
+    Cada lado puede ser un ToolExecutor (con o sin programa compilado) o cualquier
+    clasificador local con la misma interfaz. Si ambos lados son el mismo objeto,
+    o tienen la misma versión obtenida de dump_state(), cada ejemplo se evalúa
+    una sola vez.
+    """
+    
+    def __init__(self, executor_a, executor_b, names=('A', 'B'), workers: int = 8,
+                 requests_per_second: float = None):
+        self.names = names
+        self.workers = max(1, workers)
+        self.arms = [
+            DSPyEvaluator(workers=1, tool_executor=executor_a),
+            DSPyEvaluator(workers=1, tool_executor=executor_b)
+        ]
+        # Un solo límite de peticiones para ambos lados
+        rate_limiter = RateLimiter(requests_per_second) if requests_per_second else None
+        for arm in self.arms:
+            arm.rate_limiter = rate_limiter
+        # Compartir resultados solo si la versión identifica de verdad al programa;
+        # si no (lambdas, partial, clasificadores sin dump_state) cada lado evalúa lo suyo
+        if executor_a is executor_b or all(arm.state_versioned for arm in self.arms):
+            self._scopes = ('shared', 'shared')
+        else:
+            self._scopes = (0, 1)
+        self._cache = {}
+        self._cache_lock = threading.Lock()
+    
+    def _evaluate_shared(self, arm: int, example) -> dict:
+        """Evalúa un ejemplo reutilizando el resultado si la entrada es idéntica"""
+        evaluator = self.arms[arm]
+        key = (self._scopes[arm], evaluator.program_version, evaluator.example_hash(example))
+        
+        with self._cache_lock:
+            future = self._cache.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._cache[key] = future
+        
+        if owner:
+            future.set_result(evaluator._evaluate_limited(example))
+        return dict(future.result())
+    
+    def run(self, examples=None) -> dict:
+        """
+        Ejecuta ambos programas en paralelo y calcula las diferencias
+        
+        Args:
+            examples: Lista de ejemplos (usa ALL_EXAMPLES por defecto)
+            
+        Returns:
+            dict con las métricas de cada lado y las diferencias pareadas
+        """
+        if examples is None:
+            examples = ALL_EXAMPLES
+        examples = list(examples)
+        
+        print(f"\nComparando {self.names[0]} vs {self.names[1]} en {len(examples)} ejemplos...\n")
+        
+        results = [[None] * len(examples), [None] * len(examples)]
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = {
+                pool.submit(self._evaluate_shared, arm, example): (arm, i)
+                for i, example in enumerate(examples)
+                for arm in (0, 1)
+            }
+            for future in as_completed(futures):
+                arm, i = futures[future]
+                results[arm][i] = future.result()
+        
+        metrics_a = self.arms[0]._build_metrics(results[0])
+        metrics_b = self.arms[1]._build_metrics(results[1])
+        
+        return {
+            'names': self.names,
+            'a': metrics_a,
+            'b': metrics_b,
+            'tool': paired_difference(
+                [r['correct_tool'] for r in results[0]], [r['correct_tool'] for r in results[1]]
+            ),
+            'decision': paired_difference(
+                [r['correct_decision'] for r in results[0]], [r['correct_decision'] for r in results[1]]
+            ),
+            'latency_p50_delta': metrics_b['latency_p50'] - metrics_a['latency_p50'],
+            'latency_p95_delta': metrics_b['latency_p95'] - metrics_a['latency_p95'],
+            'tokens_delta': metrics_b['tokens_per_decision'] - metrics_a['tokens_per_decision'],
+            'cost_delta': metrics_b['cost_per_correct'] - metrics_a['cost_per_correct']
+        }
+    
+    def print_report(self, report: dict):
+        """Imprime la comparación A/B"""
+        name_a, name_b = report['names']
+        a, b = report['a'], report['b']
+        
+        print("\n" + "=" * 70)
+        print(f"  COMPARACIÓN A/B: {name_a} vs {name_b}")
+        print("=" * 70)
+        
+        print(f"\n{'':<24} {name_a:>12} {name_b:>12}")
+        print(f"{'Precisión (Herramienta)':<24} {a['accuracy_tool']:>11.1f}% {b['accuracy_tool']:>11.1f}%")
+        print(f"{'Precisión (Decisión)':<24} {a['accuracy_decision']:>11.1f}% {b['accuracy_decision']:>11.1f}%")
+        print(f"{'Latencia p50':<24} {a['latency_p50']:>11.2f}s {b['latency_p50']:>11.2f}s")
+        print(f"{'Latencia p95':<24} {a['latency_p95']:>11.2f}s {b['latency_p95']:>11.2f}s")
+        print(f"{'Tokens por decisión':<24} {a['tokens_per_decision']:>12.0f} {b['tokens_per_decision']:>12.0f}")
+        print(f"{'$ por decisión correcta':<24} {a['cost_per_correct']:>12.5f} {b['cost_per_correct']:>12.5f}")
+        
+        for label, key in (("Herramienta", 'tool'), ("Decisión", 'decision')):
+            d = report[key]
+            print(f"\n📊 Diferencia {label} ({name_b} - {name_a}): {d['diff']:+.1f} pts "
+                  f"[IC 95%: {d['ci_low']:+.1f}, {d['ci_high']:+.1f}]")
+            print(f"   Solo {name_b} acierta: {d['b_wins']} | Solo {name_a} acierta: {d['a_wins']}")
+        
+        print(f"\n⏱️  Δ Latencia p50/p95: {report['latency_p50_delta']:+.2f}s / "
+              f"{report['latency_p95_delta']:+.2f}s")
+        print(f"   Δ Tokens por decisión: {report['tokens_delta']:+.0f}")
+        print(f"   Δ $ por decisión correcta: {report['cost_delta']:+.5f}")
+        print("=" * 70)
 
 
 def test_live_agent():
@@ -243,30 +601,44 @@ def main():
     
     # Configurar DSPy
     try:
-        lm = dspy.LM(
-            model='openai/glm-4.6',
-            api_base='https://api.z.ai/api/paas/v4',
-            api_key=os.getenv('ZAI_API_KEY')
-        )
+        # Sin caché: un acierto de caché no registra tokens y tarda milisegundos,
+        # lo que falsearía latencia y costo al repetir la evaluación
+        lm = create_lm(cache=False)
         dspy.configure(lm=lm)
         print("\n✓ DSPy configurado correctamente\n")
     except Exception as e:
         print(f"\n❌ Error configurando DSPy: {e}\n")
         return
     
-    # Crear evaluador
-    evaluator = DSPyEvaluator()
+    # Crear evaluador (DSPY_EVAL_RUN_FILE permite reanudar ejecuciones interrumpidas)
+    evaluator = DSPyEvaluator(run_file=os.getenv('DSPY_EVAL_RUN_FILE'))
+    
+    # Dataset JSONL opcional (DSPY_EVAL_DATASET) y shard de este proceso (DSPY_EVAL_SHARD=0/4)
+    examples = None
+    dataset = os.getenv('DSPY_EVAL_DATASET')
+    if dataset:
+        examples = iter_examples(dataset)
+        shard_spec = os.getenv('DSPY_EVAL_SHARD')
+        if shard_spec:
+            index, count = (int(x) for x in shard_spec.split('/'))
+            examples = shard(examples, index, count)
     
     # Opción 1: Evaluar todos los ejemplos
     print("\n🔍 Opción 1: Evaluar todos los ejemplos")
-    metrics = evaluator.evaluate_all()
+    metrics = evaluator.evaluate_all(examples)
     evaluator.print_report(metrics)
     
     # Opción 2: Evaluar por categoría
     # print("\n🔍 Opción 2: Evaluar por categoría")
     # evaluator.evaluate_by_category()
     
-    # Opción 3: Test con agente real
+    # Opción 3: Comparar el programa base contra el compilado offline
+    # compiled = ToolExecutor(use_examples=False)
+    # compiled.load_compiled()
+    # comparison = ABComparison(ToolExecutor(use_examples=True), compiled, names=('base', 'compilado'))
+    # comparison.print_report(comparison.run())
+    
+    # Opción 4: Test con agente real
     # test_live_agent()
 
 
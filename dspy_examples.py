@@ -182,6 +182,9 @@ CODE_EXAMPLES = [
     ).with_inputs("user_query", "available_tools", "conversation_context"),
 ]
 
+# Los ejemplos de Telegram están junto a los de Selenium y tareas
+TELEGRAM_EXAMPLES = [ex for ex in SELENIUM_EXAMPLES if ex.tool_name == 'send_telegram_message']
+
 # Combinar todos los ejemplos
 ALL_EXAMPLES = (
     WEB_SEARCH_EXAMPLES +
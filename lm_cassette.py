@@ -0,0 +1,192 @@
+"""
+Cassettes de grabación/reproducción de llamadas al LM
+Permite evaluar y hacer benchmarks sin la API de Z.AI (deterministas, rápidos y gratis)
+
+Configuración (.env):
+    LM_CASSETTE_MODE=record|replay|off   (default: off)
+    LM_CASSETTE_PATH=lm_cassette.jsonl
+    LM_CASSETTE_LATENCY=0                (factor sobre la latencia grabada, 1 = real)
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from types import SimpleNamespace
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+class CassetteMissError(KeyError):
+    """La solicitud no está grabada en el cassette"""
+
+
+def to_plain(obj):
+    """Convierte respuestas del SDK (pydantic, namespaces) a tipos JSON"""
+    if isinstance(obj, (str, int, float, bool)) or obj is None:
+        return obj
+    if isinstance(obj, dict):
+        return {k: to_plain(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [to_plain(v) for v in obj]
+    if hasattr(obj, 'model_dump'):
+        return to_plain(obj.model_dump())
+    if hasattr(obj, '__dict__'):
+        return {k: to_plain(v) for k, v in vars(obj).items() if not k.startswith('_')}
+    return str(obj)
+
+
+def to_namespace(data):
+    """Reconstruye una respuesta con acceso por atributos (response.choices[0].message)"""
+    if isinstance(data, dict):
+        return SimpleNamespace(**{k: to_namespace(v) for k, v in data.items()})
+    if isinstance(data, list):
+        return [to_namespace(v) for v in data]
+    return data
+
+
+class Cassette:
+    """Archivo JSONL con pares solicitud/respuesta indexados por hash"""
+
+    def __init__(self, path: str, mode: str = "replay", latency_scale: float = 0.0):
+        """
+        Args:
+            path: Archivo del cassette
+            mode: 'record' (llama a la API y graba) o 'replay' (solo reproduce)
+            latency_scale: Factor aplicado a la latencia grabada al reproducir
+        """
+        if mode not in ('record', 'replay'):
+            raise ValueError(f"Modo de cassette inválido: {mode}")
+
+        self.path = Path(path)
+        self.mode = mode
+        self.latency_scale = latency_scale
+        self.entries = {}
+        self.lock = threading.Lock()
+        self.load()
+
+    @staticmethod
+    def key(request: dict) -> str:
+        """Hash estable de una solicitud"""
+        payload = json.dumps(to_plain(request), sort_keys=True, ensure_ascii=False)
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+    def load(self):
+        """Carga las entradas grabadas (la última grabación de cada clave gana)"""
+        if not self.path.exists():
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                self.entries[entry['k']] = entry
+
+    def play(self, request: dict, call):
+        """
+        Devuelve la respuesta de una solicitud según el modo
+
+        Args:
+            request: Parámetros de la solicitud (se usan como clave)
+            call: Función sin argumentos que hace la llamada real (modo record)
+
+        Returns:
+            Respuesta en tipos JSON
+        """
+        key = self.key(request)
+
+        if self.mode == 'replay':
+            entry = self.entries.get(key)
+            if entry is None:
+                raise CassetteMissError(f"Solicitud no grabada en {self.path} ({key[:12]})")
+            if self.latency_scale:
+                time.sleep(entry.get('t', 0) * self.latency_scale)
+            return entry['r']
+
+        start = time.perf_counter()
+        response = to_plain(call())
+        entry = {'k': key, 't': round(time.perf_counter() - start, 3), 'r': response}
+
+        with self.lock:
+            self.entries[key] = entry
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry, ensure_ascii=False, separators=(',', ':')) + "\n")
+        return response
+
+
+class _Completions:
+    """Equivalente a client.chat.completions con cassette"""
+
+    def __init__(self, owner):
+        self.owner = owner
+
+    def create(self, **params):
+        request = {'source': 'zai', **params}
+
+        if params.get('stream'):
+            chunks = self.owner.cassette.play(
+                request, lambda: list(self.owner.client.chat.completions.create(**params))
+            )
+            return iter(to_namespace(chunks))
+
+        response = self.owner.cassette.play(
+            request, lambda: self.owner.client.chat.completions.create(**params)
+        )
+        return to_namespace(response)
+
+
+class CassetteZaiClient:
+    """Cliente compatible con ZaiClient que graba o reproduce las respuestas"""
+
+    def __init__(self, cassette: Cassette, client=None):
+        """
+        Args:
+            cassette: Cassette a usar
+            client: ZaiClient real (solo necesario en modo record)
+        """
+        self.cassette = cassette
+        self.client = client
+        self.chat = SimpleNamespace(completions=_Completions(self))
+
+
+_cassettes = {}
+_cassettes_lock = threading.Lock()
+
+
+def get_cassette():
+    """
+    Obtiene el cassette configurado en el entorno (compartido en el proceso)
+
+    Returns:
+        Cassette o None si LM_CASSETTE_MODE=off
+    """
+    mode = os.getenv('LM_CASSETTE_MODE', 'off').lower()
+    if mode == 'off':
+        return None
+
+    path = os.getenv('LM_CASSETTE_PATH', 'lm_cassette.jsonl')
+    latency_scale = float(os.getenv('LM_CASSETTE_LATENCY', '0'))
+
+    with _cassettes_lock:
+        key = (path, mode)
+        if key not in _cassettes:
+            _cassettes[key] = Cassette(path, mode=mode, latency_scale=latency_scale)
+        return _cassettes[key]
+
+
+def create_zai_client():
+    """Crea el cliente de Z.AI, envuelto en un cassette si está configurado"""
+    cassette = get_cassette()
+
+    if cassette and cassette.mode == 'replay':
+        return CassetteZaiClient(cassette)
+
+    from zai import ZaiClient
+    client = ZaiClient(api_key=os.getenv("ZAI_API_KEY"))
+    if cassette:
+        return CassetteZaiClient(cassette, client)
+    return client
@@ -1,6 +1,11 @@
 """
 Manejador de Selenium para automatización web
 Permite a los agentes interactuar con navegadores web
+
+Los navegadores viven en un BrowserPool: cada sesión (un agente, o el hilo
+que llama si no se indica) usa su propio navegador entre llamadas, así
+navegar → obtener texto sigue en la misma página aunque otros agentes
+trabajen en paralelo. Los navegadores sin uso se cierran tras SELENIUM_IDLE_TIMEOUT.
 """
 
 from selenium import webdriver
@@ -11,6 +16,10 @@ from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.chrome.options import Options
 from webdriver_manager.chrome import ChromeDriverManager
+from collections import deque
+from contextlib import contextmanager
+import os
+import threading
 import time
 import json
 
@@ -246,105 +255,351 @@ class SeleniumBrowser:
             }
 
 
-# Instancia global del navegador
-_browser = None
+class BrowserPool:
+    """
+    Pool de navegadores con afinidad por sesión
+    
+    - checkout/checkin (o el context manager session()) por llamada a herramienta
+    - una sesión conserva su navegador entre llamadas; dos llamadas de la misma
+      sesión se turnan, las de sesiones distintas corren en paralelo
+    - como máximo max_size navegadores: si no hay libres se toma el de la sesión
+      inactiva más antigua o se espera hasta checkout_timeout
+    - un hilo en segundo plano cierra los navegadores sin uso tras idle_timeout,
+      conservando min_size
+    """
+    
+    def __init__(self, min_size: int = 0, max_size: int = 2, idle_timeout: float = 300.0,
+                 headless: bool = True, checkout_timeout: float = 60.0):
+        """
+        Args:
+            min_size: Navegadores que el reaper nunca cierra
+            max_size: Navegadores abiertos como máximo
+            idle_timeout: Segundos sin uso antes de liberar una sesión o cerrar un navegador
+            headless: Si True, los navegadores se ejecutan sin interfaz gráfica
+            checkout_timeout: Espera máxima por un navegador libre
+        """
+        self.min_size = min_size
+        self.max_size = max(1, max_size)
+        self.idle_timeout = idle_timeout
+        self.headless = headless
+        self.checkout_timeout = checkout_timeout
+        
+        self._cond = threading.Condition()
+        self._idle = deque()  # (navegador, último uso) sin sesión, el más reciente al final
+        self._sessions = {}  # sesión -> {'browser', 'in_use', 'last_used', 'end'}
+        self._size = 0  # Navegadores creados y no cerrados
+        self._reaper = None
+        self._stop_reaper = threading.Event()
+        self.stats = {'created': 0, 'reused': 0, 'stolen': 0, 'waits': 0, 'reaped': 0}
+    
+    def _acquire_free(self):
+        """Navegador sin sesión: uno inactivo, uno nuevo o el de la sesión inactiva más antigua"""
+        if self._idle:
+            self.stats['reused'] += 1
+            return self._idle.pop()[0]
+        if self._size < self.max_size:
+            self._size += 1
+            self.stats['created'] += 1
+            return SeleniumBrowser(headless=self.headless)  # Chrome se inicia al navegar
+        unused = [(slot['last_used'], session_id) for session_id, slot in self._sessions.items()
+                  if not slot['in_use']]
+        if unused:
+            _, session_id = min(unused)
+            self.stats['stolen'] += 1
+            print(f"♻️  Navegador de la sesión '{session_id}' reasignado (pool lleno)")
+            return self._sessions.pop(session_id)['browser']
+        return None
+    
+    def checkout(self, session_id: str = None, timeout: float = None) -> SeleniumBrowser:
+        """
+        Toma un navegador (el de la sesión si ya tiene uno)
+        
+        Raises:
+            TimeoutError: Si no se liberó ningún navegador a tiempo
+        """
+        timeout = self.checkout_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            self._start_reaper()
+            while True:
+                slot = self._sessions.get(session_id) if session_id else None
+                if slot is not None:
+                    if not slot['in_use']:
+                        slot['in_use'] = True
+                        return slot['browser']
+                else:
+                    browser = self._acquire_free()
+                    if browser is not None:
+                        if session_id:
+                            self._sessions[session_id] = {'browser': browser, 'in_use': True,
+                                                          'last_used': time.monotonic(), 'end': None}
+                        return browser
+                
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"No hay navegadores libres (máximo {self.max_size})")
+                self.stats['waits'] += 1
+                self._cond.wait(remaining)
+    
+    def checkin(self, browser: SeleniumBrowser, session_id: str = None, discard: bool = False):
+        """
+        Devuelve un navegador tomado con checkout
+        
+        Args:
+            browser: Navegador devuelto
+            session_id: Sesión con la que se tomó (lo conserva para la próxima llamada)
+            discard: Cerrar el navegador (por ejemplo, si quedó en mal estado)
+        """
+        to_close = None
+        with self._cond:
+            now = time.monotonic()
+            slot = self._sessions.get(session_id) if session_id else None
+            keep = False
+            if slot is not None and slot['browser'] is browser:
+                end = 'close' if discard else slot['end']
+                if end is None:
+                    # La sesión conserva el navegador para su próxima llamada
+                    slot['in_use'] = False
+                    slot['last_used'] = now
+                    keep = True
+                else:
+                    del self._sessions[session_id]
+                    discard = end == 'close'
+            if not keep:
+                if discard:
+                    self._size -= 1
+                    to_close = browser
+                else:
+                    self._idle.append((browser, now))
+            self._cond.notify_all()
+        if to_close:
+            to_close.close_browser()
+    
+    @contextmanager
+    def session(self, session_id: str = None, timeout: float = None):
+        """Navegador de una sesión durante un bloque with (checkout + checkin)"""
+        browser = self.checkout(session_id, timeout)
+        try:
+            yield browser
+        finally:
+            self.checkin(browser, session_id)
+    
+    def end_session(self, session_id: str, close: bool = False) -> bool:
+        """
+        Termina una sesión: su navegador vuelve al pool (o se cierra con close=True)
+        
+        Si la sesión está usando el navegador, termina al devolverlo.
+        """
+        with self._cond:
+            slot = self._sessions.get(session_id)
+            if slot is None:
+                return False
+            if slot['in_use']:
+                slot['end'] = 'close' if close else 'release'
+                return True
+            del self._sessions[session_id]
+            if close:
+                self._size -= 1
+            else:
+                self._idle.append((slot['browser'], time.monotonic()))
+            self._cond.notify_all()
+        if close:
+            slot['browser'].close_browser()
+        return True
+    
+    def reap_idle(self) -> int:
+        """
+        Libera sesiones y cierra navegadores sin uso desde hace idle_timeout
+        
+        Returns:
+            Navegadores cerrados
+        """
+        to_close = []
+        with self._cond:
+            cutoff = time.monotonic() - self.idle_timeout
+            for session_id, slot in list(self._sessions.items()):
+                if not slot['in_use'] and slot['last_used'] <= cutoff:
+                    del self._sessions[session_id]
+                    self._idle.appendleft((slot['browser'], slot['last_used']))
+            # Los más antiguos están al inicio de la cola
+            while self._idle and self._idle[0][1] <= cutoff and self._size > self.min_size:
+                to_close.append(self._idle.popleft()[0])
+                self._size -= 1
+            self.stats['reaped'] += len(to_close)
+            if to_close:
+                self._cond.notify_all()
+        for browser in to_close:
+            browser.close_browser()
+        return len(to_close)
+    
+    def _start_reaper(self):
+        """Inicia el hilo que cierra navegadores inactivos (con el bloqueo tomado)"""
+        if self._reaper and self._reaper.is_alive():
+            return
+        self._stop_reaper.clear()
+        self._reaper = threading.Thread(target=self._reap_loop, daemon=True)
+        self._reaper.start()
+    
+    def _reap_loop(self):
+        interval = max(1.0, self.idle_timeout / 2)
+        while not self._stop_reaper.wait(interval):
+            try:
+                self.reap_idle()
+            except Exception as e:
+                print(f"⚠️  Error cerrando navegadores inactivos: {e}")
+    
+    def warm_up(self) -> int:
+        """Abre Chrome en min_size navegadores para que las primeras sesiones no esperen"""
+        browsers = [self.checkout() for _ in range(self.min_size)]
+        for browser in browsers:
+            browser.start_browser()
+        for browser in browsers:
+            self.checkin(browser)
+        return len(browsers)
+    
+    def close_all(self):
+        """Cierra los navegadores que no están en uso y detiene el reaper"""
+        self._stop_reaper.set()
+        with self._cond:
+            to_close = [browser for browser, _ in self._idle]
+            self._idle.clear()
+            for session_id, slot in list(self._sessions.items()):
+                if slot['in_use']:
+                    slot['end'] = 'close'
+                else:
+                    to_close.append(self._sessions.pop(session_id)['browser'])
+            self._size -= len(to_close)
+            self._cond.notify_all()
+        for browser in to_close:
+            browser.close_browser()
+    
+    def get_stats(self) -> dict:
+        """Tamaño del pool, sesiones y contadores de uso"""
+        with self._cond:
+            return {
+                'size': self._size,
+                'idle': len(self._idle),
+                'sessions': len(self._sessions),
+                'in_use': sum(1 for slot in self._sessions.values() if slot['in_use']),
+                **self.stats
+            }
+
+
+# Pool compartido del proceso
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> BrowserPool:
+    """Obtiene o crea el pool de navegadores (configurado con SELENIUM_POOL_*)"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = BrowserPool(
+                min_size=int(os.getenv('SELENIUM_POOL_MIN', '0')),
+                max_size=int(os.getenv('SELENIUM_POOL_MAX', '2')),
+                idle_timeout=float(os.getenv('SELENIUM_IDLE_TIMEOUT', '300')),
+                headless=os.getenv('SELENIUM_HEADLESS', 'true').lower() != 'false'
+            )
+        return _pool
+
+
+def _session(session_id: str = None) -> str:
+    """Sesión de una llamada: la indicada o, por defecto, el hilo actual"""
+    return session_id or f"thread-{threading.get_ident()}"
 
 
-def get_browser(headless: bool = True) -> SeleniumBrowser:
-    """Obtiene o crea la instancia del navegador"""
-    global _browser
-    if _browser is None:
-        _browser = SeleniumBrowser(headless=headless)
-    return _browser
+def _with_browser(session_id: str, action) -> dict:
+    """Ejecuta una acción con el navegador de la sesión"""
+    try:
+        with get_pool().session(_session(session_id)) as browser:
+            return action(browser)
+    except TimeoutError as e:
+        return {'success': False, 'error': str(e)}
 
 
-def selenium_navigate(url: str) -> dict:
+def selenium_navigate(url: str, session_id: str = None) -> dict:
     """Navega a una URL"""
-    browser = get_browser()
-    return browser.navigate_to(url)
+    return _with_browser(session_id, lambda browser: browser.navigate_to(url))
 
 
-def selenium_get_text() -> dict:
+def selenium_get_text(session_id: str = None) -> dict:
     """Obtiene el texto de la página actual"""
-    browser = get_browser()
-    return browser.get_page_text()
+    return _with_browser(session_id, lambda browser: browser.get_page_text())
 
 
-def selenium_find_text(selector: str, by: str = 'css') -> dict:
+def selenium_find_text(selector: str, by: str = 'css', session_id: str = None) -> dict:
     """Encuentra y obtiene texto de un elemento"""
-    browser = get_browser()
-    return browser.find_element_text(selector, by)
+    return _with_browser(session_id, lambda browser: browser.find_element_text(selector, by))
 
 
-def selenium_click(selector: str, by: str = 'css') -> dict:
+def selenium_click(selector: str, by: str = 'css', session_id: str = None) -> dict:
     """Hace clic en un elemento"""
-    browser = get_browser()
-    return browser.click_element(selector, by)
+    return _with_browser(session_id, lambda browser: browser.click_element(selector, by))
 
 
-def selenium_fill(selector: str, text: str, by: str = 'css') -> dict:
+def selenium_fill(selector: str, text: str, by: str = 'css', session_id: str = None) -> dict:
     """Llena un campo de entrada"""
-    browser = get_browser()
-    return browser.fill_input(selector, text, by)
+    return _with_browser(session_id, lambda browser: browser.fill_input(selector, text, by))
 
 
-def selenium_screenshot(filename: str = 'screenshot.png') -> dict:
+def selenium_screenshot(filename: str = 'screenshot.png', session_id: str = None) -> dict:
     """Toma una captura de pantalla"""
-    browser = get_browser()
-    return browser.take_screenshot(filename)
+    return _with_browser(session_id, lambda browser: browser.take_screenshot(filename))
 
 
-def selenium_close() -> dict:
-    """Cierra el navegador"""
-    global _browser
-    if _browser:
-        _browser.close_browser()
-        _browser = None
+def selenium_close(session_id: str = None) -> dict:
+    """Cierra el navegador de la sesión"""
+    if get_pool().end_session(_session(session_id), close=True):
         return {'success': True, 'message': 'Navegador cerrado'}
     return {'success': True, 'message': 'Navegador ya estaba cerrado'}
 
 
-def handle_selenium_call(function_name: str, arguments: dict) -> dict:
+def handle_selenium_call(function_name: str, arguments: dict, session_id: str = None) -> dict:
     """
     Maneja las llamadas a funciones de Selenium
     
     Args:
         function_name: Nombre de la función
         arguments: Argumentos de la función
+        session_id: Sesión del navegador (por defecto el hilo actual)
         
     Returns:
         Resultado de la función
     """
     if function_name == 'selenium_navigate':
-        return selenium_navigate(arguments.get('url'))
+        return selenium_navigate(arguments.get('url'), session_id=session_id)
     
     elif function_name == 'selenium_get_text':
-        return selenium_get_text()
+        return selenium_get_text(session_id=session_id)
     
     elif function_name == 'selenium_find_text':
         return selenium_find_text(
             arguments.get('selector'),
-            arguments.get('by', 'css')
+            arguments.get('by', 'css'),
+            session_id=session_id
         )
     
     elif function_name == 'selenium_click':
         return selenium_click(
             arguments.get('selector'),
-            arguments.get('by', 'css')
+            arguments.get('by', 'css'),
+            session_id=session_id
         )
     
     elif function_name == 'selenium_fill':
         return selenium_fill(
             arguments.get('selector'),
             arguments.get('text'),
-            arguments.get('by', 'css')
+            arguments.get('by', 'css'),
+            session_id=session_id
         )
     
     elif function_name == 'selenium_screenshot':
-        return selenium_screenshot(arguments.get('filename', 'screenshot.png'))
+        return selenium_screenshot(arguments.get('filename', 'screenshot.png'), session_id=session_id)
     
     elif function_name == 'selenium_close':
-        return selenium_close()
+        return selenium_close(session_id=session_id)
     
     else:
         return {
@@ -0,0 +1,160 @@
+"""
+Archivo histórico de tareas completadas
+Mueve las tareas completadas a archivos JSONL comprimidos, particionados por fecha,
+para que el store activo (tasks.json / tasks.db) se mantenga pequeño
+
+Estructura:
+    tasks_archive/2025-01/2025-01-31.jsonl.gz   (una tarea por línea, fecha de completado)
+
+Uso:
+    archive = TaskArchive()
+    get_task_manager().archive_completed(archive, older_than='7d')
+    archive.search(text="bitcoin", since="2025-01-01")
+
+    # o desde la terminal:
+    python task_archive.py archive [7d] [mantener_ultimas]
+    python task_archive.py search <texto> [desde] [hasta]
+"""
+
+import gzip
+import json
+import os
+import sys
+from datetime import date, datetime
+from pathlib import Path
+from typing import Iterator, List, Optional
+from dotenv import load_dotenv
+from task_manager import Task, get_task_manager
+
+load_dotenv()
+
+
+def _to_date(value) -> Optional[date]:
+    """Acepta date, datetime, epoch o texto ISO ('2025-01-31')"""
+    if value is None or isinstance(value, date) and not isinstance(value, datetime):
+        return value
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value).date()
+    return datetime.fromisoformat(value).date()
+
+
+class TaskArchive:
+    """Archivos .jsonl.gz por día con las tareas completadas"""
+
+    def __init__(self, archive_dir: str = "tasks_archive"):
+        self.archive_dir = Path(archive_dir)
+
+    def _partition(self, day: date) -> Path:
+        return self.archive_dir / f"{day:%Y-%m}" / f"{day:%Y-%m-%d}.jsonl.gz"
+
+    def write(self, tasks: List[Task]) -> int:
+        """
+        Agrega tareas a la partición de su fecha de completado
+
+        Cada llamada agrega un miembro gzip al final del archivo del día
+        (gzip los lee como un solo flujo), así no hay que reescribir nada.
+
+        Returns:
+            Número de tareas escritas
+        """
+        by_day = {}
+        for task in tasks:
+            timestamp = task.completed_ts or task.created_ts
+            by_day.setdefault(datetime.fromtimestamp(timestamp).date(), []).append(task)
+
+        for day, day_tasks in by_day.items():
+            path = self._partition(day)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            data = "".join(
+                json.dumps(t.to_row(), ensure_ascii=False, separators=(',', ':')) + "\n" for t in day_tasks
+            )
+            with gzip.open(path, 'at', encoding='utf-8') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+        return len(tasks)
+
+    def partitions(self, since=None, until=None) -> List[Path]:
+        """Archivos de partición dentro del rango de fechas (inclusive), ordenados"""
+        since, until = _to_date(since), _to_date(until)
+        paths = []
+        for path in sorted(self.archive_dir.glob("*/*.jsonl.gz")):
+            day = date.fromisoformat(path.name[:10])
+            if (since and day < since) or (until and day > until):
+                continue
+            paths.append(path)
+        return paths
+
+    def iter_tasks(self, since=None, until=None) -> Iterator[Task]:
+        """Recorre las tareas archivadas sin cargarlas todas en memoria"""
+        for path in self.partitions(since, until):
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        yield Task.from_dict(json.loads(line))
+                    except (ValueError, KeyError):
+                        continue  # Línea incompleta tras un cierre inesperado
+
+    def search(self, text: str = None, agent_name: str = None, since=None, until=None,
+               limit: int = None) -> List[Task]:
+        """
+        Busca en el archivo (solo lee las particiones del rango de fechas)
+
+        Args:
+            text: Texto en la descripción, sin distinguir mayúsculas
+            agent_name: Solo tareas de este agente
+            since / until: Fechas de completado (inclusive)
+            limit: Máximo de resultados
+        """
+        text = text.lower() if text else None
+        found = {}
+        for task in self.iter_tasks(since, until):
+            if agent_name and task.assigned_to != agent_name:
+                continue
+            if text and text not in task.description.lower():
+                continue
+            found[task.id] = task  # Si se archivó dos veces (interrupción), gana la última
+            if limit and len(found) >= limit:
+                break
+        return sorted(found.values(), key=lambda t: t.id)
+
+    def get(self, task_id: int) -> Optional[Task]:
+        """Busca una tarea archivada por ID (recorre todas las particiones)"""
+        result = None
+        for task in self.iter_tasks():
+            if task.id == task_id:
+                result = task
+        return result
+
+    def stats(self) -> dict:
+        """Particiones, tareas y tamaño en disco del archivo"""
+        paths = self.partitions()
+        return {
+            'partitions': len(paths),
+            'tasks': sum(1 for _ in self.iter_tasks()),
+            'bytes': sum(p.stat().st_size for p in paths)
+        }
+
+
+if __name__ == "__main__":
+    archive = TaskArchive(os.getenv('TASKS_ARCHIVE_DIR', 'tasks_archive'))
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+
+    if command == 'archive':
+        older_than = sys.argv[2] if len(sys.argv) > 2 else os.getenv('TASKS_ARCHIVE_AFTER') or None
+        keep_last = sys.argv[3] if len(sys.argv) > 3 else os.getenv('TASKS_ARCHIVE_KEEP') or None
+        count = get_task_manager().archive_completed(
+            archive, older_than=older_than, keep_last=int(keep_last) if keep_last else None
+        )
+        print(f"📦 {count} tareas archivadas en {archive.archive_dir}")
+    elif command == 'search':
+        text = sys.argv[2] if len(sys.argv) > 2 else None
+        since = sys.argv[3] if len(sys.argv) > 3 else None
+        until = sys.argv[4] if len(sys.argv) > 4 else None
+        for task in archive.search(text=text, since=since, until=until):
+            print(f"  {task}  ({task.completed_at})")
+    else:
+        print("Uso: python task_archive.py archive [7d] [mantener_ultimas]")
+        print("     python task_archive.py search <texto> [desde] [hasta]")
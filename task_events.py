@@ -0,0 +1,160 @@
+"""
+Eventos de cambios en las tareas
+Pub/sub en el proceso (TaskEventBus) y log JSONL que otros procesos pueden seguir (TaskEventLog)
+
+Tipos de evento: created, assigned, completed, deleted, updated, archived, claimed, requeued
+
+Formato (una línea por evento):
+    {"type": "completed", "task_id": 3, "ts": 1718000000.1, "pid": 4242, ...}
+
+Uso:
+    manager = get_task_manager()
+    unsubscribe = manager.events.subscribe(lambda e: print(e), types=['completed'])
+
+    # Con el log activado (TASKS_EVENT_LOG=on, o event_log=True / ruta al crear el gestor),
+    # desde otro proceso (o en la terminal: python task_events.py tasks.json.events.jsonl)
+    for event in TaskEventLog("tasks.json.events.jsonl").follow():
+        print(event)
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+EVENT_TYPES = ('created', 'assigned', 'completed', 'deleted', 'updated', 'archived',
+               'claimed', 'requeued')
+
+
+def make_event(event_type: str, task_id: int, **data) -> dict:
+    """Crea un evento con marca de tiempo y proceso de origen"""
+    return {'type': event_type, 'task_id': task_id, 'ts': time.time(), 'pid': os.getpid(), **data}
+
+
+class TaskEventBus:
+    """Pub/sub en el proceso: los suscriptores reciben cada evento publicado"""
+
+    def __init__(self):
+        self._subscribers = []
+        self._lock = threading.Lock()
+
+    def subscribe(self, callback: Callable[[dict], None], types: Iterable[str] = None) -> Callable[[], None]:
+        """
+        Registra un suscriptor
+
+        Args:
+            callback: Función que recibe el evento (debe ser rápida; se llama en el
+                hilo que hizo el cambio)
+            types: Tipos de evento a recibir (por defecto todos)
+
+        Returns:
+            Función sin argumentos que cancela la suscripción
+        """
+        entry = (callback, frozenset(types) if types else None)
+        with self._lock:
+            self._subscribers.append(entry)
+
+        def unsubscribe():
+            with self._lock:
+                if entry in self._subscribers:
+                    self._subscribers.remove(entry)
+        return unsubscribe
+
+    def publish(self, events: List[dict]):
+        """Entrega los eventos a los suscriptores (los errores de un suscriptor no afectan al resto)"""
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for event in events:
+            for callback, types in subscribers:
+                if types is not None and event['type'] not in types:
+                    continue
+                try:
+                    callback(event)
+                except Exception as e:
+                    print(f"⚠️  Error en suscriptor de eventos: {e}")
+
+
+class TaskEventLog:
+    """Log JSONL de eventos, de solo anexado, que otros procesos pueden seguir"""
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+
+    def append(self, events: List[dict]):
+        """Agrega eventos al log en una sola escritura"""
+        if not events:
+            return
+        data = "".join(
+            json.dumps(event, ensure_ascii=False, separators=(',', ':')) + "\n" for event in events
+        )
+        try:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(data)
+        except OSError as e:
+            print(f"⚠️  Error escribiendo eventos: {e}")
+
+    def read(self, offset: int = 0) -> Tuple[List[dict], int]:
+        """
+        Lee los eventos completos a partir de un offset en bytes
+
+        Returns:
+            (eventos, nuevo offset). Una línea a medio escribir se deja para la
+            próxima lectura; si el log se truncó, se vuelve a leer desde el inicio.
+        """
+        try:
+            size = os.path.getsize(self.path)
+        except FileNotFoundError:
+            return [], 0
+        if size < offset:
+            offset = 0
+
+        events = []
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                offset += len(line)
+                try:
+                    events.append(json.loads(line))
+                except ValueError:
+                    continue
+        return events, offset
+
+    def follow(self, offset: Optional[int] = None, poll_interval: float = 0.5,
+               stop: threading.Event = None) -> Iterator[dict]:
+        """
+        Sigue el log como `tail -f`
+
+        Args:
+            offset: Offset inicial en bytes (por defecto el final actual: solo eventos nuevos)
+            poll_interval: Espera entre lecturas cuando no hay eventos nuevos
+            stop: Evento opcional para terminar el seguimiento
+        """
+        if offset is None:
+            offset = os.path.getsize(self.path) if self.path.exists() else 0
+        while not (stop and stop.is_set()):
+            events, offset = self.read(offset)
+            yield from events
+            if not events:
+                if stop:
+                    stop.wait(poll_interval)
+                else:
+                    time.sleep(poll_interval)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Uso: python task_events.py <archivo.events.jsonl>")
+        sys.exit(1)
+
+    print(f"👂 Siguiendo eventos de {sys.argv[1]} (Ctrl+C para salir)")
+    try:
+        for event in TaskEventLog(sys.argv[1]).follow():
+            print(f"[{time.strftime('%H:%M:%S', time.localtime(event['ts']))}] "
+                  f"{event['type']:<10} #{event['task_id']} {event.get('agent') or ''}")
+    except KeyboardInterrupt:
+        pass
@@ -3,28 +3,266 @@ Sistema de Gestión de Tareas para Agentes
 Permite programar tareas y que el agente las marque como completadas
 """
 
+import heapq
 import json
+import math
+import os
+import re
+import socket
+import sqlite3
+import threading
+import time
 from pathlib import Path
 from datetime import datetime
 from typing import List, Dict, Optional
+from task_events import TaskEventBus, TaskEventLog, make_event
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+class ConcurrentModificationError(Exception):
+    """Otro proceso modificó el almacenamiento sin tomar el bloqueo"""
+
+
+class DependencyError(ValueError):
+    """Dependencias inválidas: tareas inexistentes o un ciclo"""
+
+
+# Estados aceptados por TaskManager.query_tasks y la herramienta task_list
+TASK_STATUSES = ('pending', 'ready', 'completed', 'all')
+
+# Segundos que dura la concesión (lease) de una tarea reclamada sin heartbeat
+DEFAULT_LEASE_SECONDS = 300
+
+
+def default_worker_id() -> str:
+    """Identificador del trabajador para las concesiones: host:pid"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class FileLock:
+    """
+    Bloqueo exclusivo entre procesos (y reentrante entre hilos) sobre un archivo .lock
+    
+    Uso:
+        with FileLock("tasks.json.lock"):
+            # ... leer, modificar y escribir ...
+    """
+    
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._file = None
+    
+    def acquire(self):
+        self._thread_lock.acquire()
+        self._depth += 1
+        if self._depth > 1:
+            return
+        
+        self._file = open(self.path, 'a+')
+        if fcntl:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+        else:
+            while True:
+                try:
+                    msvcrt.locking(self._file.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue  # LK_LOCK se rinde tras 10 s; seguir esperando
+    
+    def release(self):
+        self._depth -= 1
+        if self._depth == 0:
+            if fcntl:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            else:
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+            self._file.close()
+            self._file = None
+        self._thread_lock.release()
+    
+    def __enter__(self):
+        self.acquire()
+        return self
+    
+    def __exit__(self, *exc):
+        self.release()
+
+
+def _to_epoch(value) -> Optional[int]:
+    """Convierte una marca de tiempo (epoch o ISO, formato anterior) a segundos epoch"""
+    if value is None or type(value) is int:
+        return value
+    if value == '':
+        return None
+    if isinstance(value, float):
+        return int(value)
+    if value.isdigit():
+        return int(value)
+    return int(datetime.fromisoformat(value).timestamp())
+
+
+def _to_iso(timestamp: Optional[int]) -> Optional[str]:
+    """Formatea segundos epoch como ISO (hora local)"""
+    if timestamp is None:
+        return None
+    return datetime.fromtimestamp(timestamp).isoformat()
+
+
+_INTERVAL_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+_INTERVAL_NAMES = {'hourly': 3600, 'daily': 86400, 'weekly': 604800}
+
+
+def parse_interval(value) -> Optional[int]:
+    """
+    Convierte una recurrencia a segundos
+    
+    Acepta segundos (int), '30m', '2h', '1d', '1w' o 'hourly'/'daily'/'weekly'.
+    """
+    if value is None or type(value) is int:
+        return value
+    if value == '':
+        return None
+    if isinstance(value, float):
+        return int(value) if value > 0 else None
+    value = value.strip().lower()
+    if value in _INTERVAL_NAMES:
+        return _INTERVAL_NAMES[value]
+    match = re.fullmatch(r'(\d+)\s*([smhdw]?)', value)
+    if not match:
+        raise ValueError(f"Recurrencia inválida: {value}")
+    seconds = int(match.group(1)) * _INTERVAL_UNITS[match.group(2) or 's']
+    return seconds or None
+
+
+def parse_due(value) -> Optional[int]:
+    """
+    Convierte un vencimiento a segundos epoch
+    
+    Acepta epoch, ISO ('2025-01-31T09:00') o relativo al momento actual ('+30m', '+1d';
+    '+0m' es ahora).
+    """
+    if value is None:
+        return None
+    if isinstance(value, str) and value.strip().startswith('+'):
+        return int(time.time()) + (parse_interval(value.strip()[1:]) or 0)
+    return _to_epoch(value)
+
+
+def _parse_ids(value) -> tuple:
+    """Normaliza una lista de IDs (lista, JSON o '1,2') a una tupla ordenada sin repetidos"""
+    if not value:
+        return ()
+    if isinstance(value, str):
+        value = json.loads(value) if value.lstrip().startswith('[') else value.split(',')
+    return tuple(sorted({int(v) for v in value}))
 
 
 class Task:
-    """Representa una tarea individual"""
+    """
+    Representa una tarea individual
+    
+    Usa __slots__ y guarda las fechas como segundos epoch (created_ts,
+    completed_ts, due_ts, lease_ts); created_at/completed_at/due_at/lease_expires
+    las formatean en ISO solo al leerlas.
+    """
+    
+    __slots__ = ('id', 'description', 'completed', 'created_ts', 'completed_ts', 'assigned_to',
+                 'priority', 'due_ts', 'recurrence', 'depends_on', 'leased_by', 'lease_ts')
     
     def __init__(self, id: int, description: str, completed: bool = False, 
-                 created_at: str = None, completed_at: str = None, assigned_to: str = None):
+                 created_at=None, completed_at=None, assigned_to: str = None,
+                 priority: int = 0, due_at=None, recurrence=None, depends_on=None,
+                 leased_by: str = None, lease_expires=None):
         self.id = id
         self.description = description
         self.completed = completed
-        self.created_at = created_at or datetime.now().isoformat()
-        self.completed_at = completed_at
+        self.created_ts = _to_epoch(created_at) if created_at is not None else int(time.time())
+        self.completed_ts = _to_epoch(completed_at)
         self.assigned_to = assigned_to  # Nombre del agente asignado
+        self.priority = int(priority or 0)  # Mayor número = más urgente
+        self.due_ts = parse_due(due_at)
+        self.recurrence = parse_interval(recurrence)  # Segundos entre repeticiones
+        self.depends_on = _parse_ids(depends_on)  # IDs que deben completarse antes
+        self.leased_by = leased_by  # Trabajador que la reclamó (claim_next)
+        self.lease_ts = _to_epoch(lease_expires)  # Fin de la concesión
+    
+    @property
+    def created_at(self) -> str:
+        return _to_iso(self.created_ts)
+    
+    @created_at.setter
+    def created_at(self, value):
+        self.created_ts = _to_epoch(value)
+    
+    @property
+    def completed_at(self) -> Optional[str]:
+        return _to_iso(self.completed_ts)
+    
+    @completed_at.setter
+    def completed_at(self, value):
+        self.completed_ts = _to_epoch(value)
+    
+    @property
+    def due_at(self) -> Optional[str]:
+        return _to_iso(self.due_ts)
+    
+    @due_at.setter
+    def due_at(self, value):
+        self.due_ts = parse_due(value)
+    
+    @property
+    def lease_expires(self) -> Optional[str]:
+        return _to_iso(self.lease_ts)
+    
+    @lease_expires.setter
+    def lease_expires(self, value):
+        self.lease_ts = _to_epoch(value)
+    
+    def is_leased(self, now: float = None) -> bool:
+        """True si un trabajador tiene la tarea reclamada y su concesión no venció"""
+        if self.completed or not self.leased_by or self.lease_ts is None:
+            return False
+        return self.lease_ts > (time.time() if now is None else now)
+    
+    def is_due(self, now: float = None) -> bool:
+        """True si la tarea está pendiente y su vencimiento ya pasó"""
+        if self.completed or self.due_ts is None:
+            return False
+        return self.due_ts <= (time.time() if now is None else now)
+    
+    def next_occurrence(self, now: float = None) -> Optional['Task']:
+        """
+        Siguiente repetición de una tarea recurrente (sin ID)
+        
+        El nuevo vencimiento avanza al menos una recurrencia (aunque se complete
+        antes de vencer) y, si está atrasada, en múltiplos hasta quedar en el
+        futuro, así no se generan repeticiones acumuladas.
+        """
+        if not self.recurrence:
+            return None
+        now = int(time.time() if now is None else now)
+        due = self.due_ts if self.due_ts is not None else now
+        if due <= now:
+            due += ((now - due) // self.recurrence + 1) * self.recurrence
+        else:
+            due += self.recurrence
+        return Task(id=None, description=self.description, assigned_to=self.assigned_to,
+                    priority=self.priority, due_at=due, recurrence=self.recurrence)
     
     def complete(self):
         """Marca la tarea como completada"""
         self.completed = True
-        self.completed_at = datetime.now().isoformat()
+        self.completed_ts = int(time.time())
+        self.leased_by = None
+        self.lease_ts = None
     
     def to_dict(self) -> dict:
         """Convierte la tarea a diccionario"""
@@ -34,133 +272,850 @@ class Task:
             'completed': self.completed,
             'created_at': self.created_at,
             'completed_at': self.completed_at,
-            'assigned_to': self.assigned_to
+            'assigned_to': self.assigned_to,
+            'priority': self.priority,
+            'due_at': self.due_at,
+            'recurrence': self.recurrence,
+            'depends_on': list(self.depends_on),
+            'leased_by': self.leased_by,
+            'lease_expires': self.lease_expires
+        }
+    
+    def to_row(self) -> dict:
+        """Como to_dict, pero con las fechas en segundos epoch (tasks.json, journal, SQLite)"""
+        return {
+            'id': self.id,
+            'description': self.description,
+            'completed': self.completed,
+            'created_at': self.created_ts,
+            'completed_at': self.completed_ts,
+            'assigned_to': self.assigned_to,
+            'priority': self.priority,
+            'due_at': self.due_ts,
+            'recurrence': self.recurrence,
+            'depends_on': list(self.depends_on),
+            'leased_by': self.leased_by,
+            'lease_expires': self.lease_ts
         }
     
     @classmethod
     def from_dict(cls, data: dict):
-        """Crea una tarea desde un diccionario"""
-        return cls(
-            id=data['id'],
-            description=data['description'],
-            completed=data.get('completed', False),
-            created_at=data.get('created_at'),
-            completed_at=data.get('completed_at'),
-            assigned_to=data.get('assigned_to')
-        )
+        """
+        Crea una tarea desde un diccionario (fechas ISO o epoch)
+        
+        Asigna los slots directamente en lugar de pasar por __init__: es la ruta
+        de carga de tasks.json y del journal, una vez por tarea.
+        """
+        task = cls.__new__(cls)
+        task.id = data['id']
+        task.description = data['description']
+        task.completed = data.get('completed', False)
+        created = data.get('created_at')
+        task.created_ts = _to_epoch(created) if created is not None else int(time.time())
+        task.completed_ts = _to_epoch(data.get('completed_at'))
+        task.assigned_to = data.get('assigned_to')
+        task.priority = int(data.get('priority') or 0)
+        task.due_ts = parse_due(data.get('due_at'))
+        task.recurrence = parse_interval(data.get('recurrence'))
+        task.depends_on = _parse_ids(data.get('depends_on'))
+        task.leased_by = data.get('leased_by')
+        task.lease_ts = _to_epoch(data.get('lease_expires'))
+        return task
     
     def __str__(self):
         status = "✅" if self.completed else "⬜"
         agent_info = f" → {self.assigned_to}" if self.assigned_to else ""
-        return f"{status} [{self.id}] {self.description}{agent_info}"
+        schedule_info = ""
+        if self.priority:
+            schedule_info += f" ⚡{self.priority}"
+        if self.due_ts is not None and not self.completed:
+            schedule_info += f" ⏰ {datetime.fromtimestamp(self.due_ts):%Y-%m-%d %H:%M}"
+        if self.recurrence:
+            schedule_info += " 🔁"
+        if self.depends_on and not self.completed:
+            schedule_info += f" ⛓️ {','.join(f'#{d}' for d in self.depends_on)}"
+        if self.is_leased():
+            schedule_info += f" 🔒 {self.leased_by}"
+        return f"{status} [{self.id}] {self.description}{agent_info}{schedule_info}"
 
 
 class TaskManager:
     """Gestor de tareas para agentes"""
     
-    def __init__(self, tasks_file: str = "tasks.json"):
+    # Reintentos de una operación si otro proceso escribió sin bloqueo
+    MAX_RETRIES = 3
+    
+    def __init__(self, tasks_file: str = "tasks.json", event_log=None):
+        """
+        Args:
+            tasks_file: Archivo JSON de tareas
+            event_log: Log de eventos para otros procesos: ruta del archivo, o True
+                para <tasks_file>.events.jsonl (desactivado por defecto: crece sin límite)
+        """
         self.tasks_file = Path(tasks_file)
         self.tasks: List[Task] = []
         self.next_id = 1
+        self._file_stamp = None  # (mtime, tamaño) del archivo en la última carga/escritura
+        self.lock = FileLock(f"{tasks_file}.lock")
+        self._init_events(f"{tasks_file}.events.jsonl" if event_log is True else event_log)
         self.load_tasks()
     
+    # --- Eventos ---
+    # Cada operación persistida se traduce en eventos: se anexan al log dentro
+    # del bloqueo (mismo orden que las escrituras) y se publican en el proceso
+    # al salir de la transacción, para no llamar suscriptores con el bloqueo tomado.
+    
+    def _init_events(self, event_log: Optional[str]):
+        self.events = TaskEventBus()
+        self.event_log = TaskEventLog(event_log) if event_log else None
+        self._outbox: List[dict] = []
+    
+    def _op_events(self, op: str, data: dict) -> List[dict]:
+        """Traduce una operación del store a eventos"""
+        if op == 'add':
+            task = Task.from_dict(data['task'])
+            return [make_event('created', task.id, agent=task.assigned_to, task=task.to_dict())]
+        if op == 'complete':
+            return [make_event('completed', data['id'], completed_at=_to_iso(data.get('completed_at')))]
+        if op == 'assign':
+            return [make_event('assigned', data['id'], agent=data.get('agent'))]
+        if op == 'delete':
+            return [make_event('deleted', data['id'])]
+        if op == 'clear_completed':
+            return [make_event('deleted', task_id) for task_id in data.get('ids', [])]
+        if op == 'archive':
+            return [make_event('archived', task_id) for task_id in data.get('ids', [])]
+        if op == 'schedule':
+            return [make_event('updated', data['id'], priority=data.get('priority'),
+                               due_at=_to_iso(data.get('due_at')), recurrence=data.get('recurrence'))]
+        if op == 'depends':
+            return [make_event('updated', data['id'], depends_on=data.get('depends_on'))]
+        if op == 'lease':
+            # Los heartbeats solo extienden la concesión: no generan eventos
+            if data.get('reason') == 'claim':
+                return [make_event('claimed', data['id'], worker=data.get('leased_by'),
+                                   lease_expires=_to_iso(data.get('lease_expires')))]
+            if data.get('reason') in ('release', 'expired'):
+                return [make_event('requeued', data['id'], reason=data['reason'])]
+            return []
+        if op == 'batch':
+            return [event for entry in data.get('ops', []) for event in self._op_events(entry['op'], entry)]
+        return []
+    
+    def _record_events(self, op: str, data: dict):
+        """Anexa al log los eventos de una operación persistida y los deja para publicar"""
+        events = self._op_events(op, data)
+        if self.event_log:
+            self.event_log.append(events)
+        self._outbox.extend(events)
+    
+    def _publish_outbox(self, events: List[dict]):
+        if events:
+            self.events.publish(events)
+    
+    # --- Índices en memoria ---
+    # _by_id conserva el orden por ID; _pending/_completed y _by_agent son
+    # dicts usados como conjuntos ordenados; _dependents es el índice inverso de
+    # depends_on; _due_heap es un heap de (vencimiento, -prioridad, id) con
+    # borrado perezoso. Toda modificación pasa
+    # por los métodos _index_* para que los índices y el contador sigan consistentes.
+    
+    @property
+    def tasks(self) -> List[Task]:
+        """Todas las tareas, ordenadas por ID"""
+        with self.lock:
+            return list(self._by_id.values())
+    
+    @tasks.setter
+    def tasks(self, tasks: List[Task]):
+        self._by_id: Dict[int, Task] = {}
+        self._pending: Dict[int, Task] = {}
+        self._completed: Dict[int, Task] = {}
+        self._by_agent: Dict[str, Dict[int, Task]] = {}
+        self._dependents: Dict[int, Dict[int, Task]] = {}
+        self._due_heap: list = []
+        for task in tasks:
+            self._index_add(task)
+    
+    def _index_add(self, task: Task):
+        self._by_id[task.id] = task
+        (self._completed if task.completed else self._pending)[task.id] = task
+        if task.assigned_to:
+            self._by_agent.setdefault(task.assigned_to, {})[task.id] = task
+        for dep_id in task.depends_on:
+            self._dependents.setdefault(dep_id, {})[task.id] = task
+        if task.due_ts is not None and not task.completed:
+            heapq.heappush(self._due_heap, (task.due_ts, -task.priority, task.id))
+    
+    def _heap_entry_valid(self, entry) -> bool:
+        """Una entrada del heap es válida si la tarea sigue pendiente con ese vencimiento"""
+        due_ts, neg_priority, task_id = entry
+        task = self._pending.get(task_id)
+        return task is not None and task.due_ts == due_ts and task.priority == -neg_priority
+    
+    def _index_remove(self, task: Task):
+        self._by_id.pop(task.id, None)
+        self._pending.pop(task.id, None)
+        self._completed.pop(task.id, None)
+        self._unassign(task)
+        self._undepend(task)
+    
+    def _undepend(self, task: Task):
+        for dep_id in task.depends_on:
+            dependents = self._dependents.get(dep_id)
+            if dependents is not None:
+                dependents.pop(task.id, None)
+                if not dependents:
+                    del self._dependents[dep_id]
+    
+    def _index_depends(self, task: Task, depends_on: tuple):
+        self._undepend(task)
+        task.depends_on = depends_on
+        for dep_id in depends_on:
+            self._dependents.setdefault(dep_id, {})[task.id] = task
+    
+    def _unassign(self, task: Task):
+        agent_tasks = self._by_agent.get(task.assigned_to)
+        if agent_tasks is not None:
+            agent_tasks.pop(task.id, None)
+            if not agent_tasks:
+                del self._by_agent[task.assigned_to]
+    
+    def _index_complete(self, task: Task):
+        self._pending.pop(task.id, None)
+        self._completed[task.id] = task
+    
+    def _index_assign(self, task: Task, agent_name: str):
+        self._unassign(task)
+        task.assigned_to = agent_name
+        if agent_name:
+            self._by_agent.setdefault(agent_name, {})[task.id] = task
+    
+    def _stat_file(self):
+        """Firma del archivo para detectar cambios de otros procesos"""
+        try:
+            stat = os.stat(self.tasks_file)
+            return (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            return None
+    
     def load_tasks(self):
-        """Carga tareas desde archivo"""
-        if self.tasks_file.exists():
-            try:
-                with open(self.tasks_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    self.tasks = [Task.from_dict(t) for t in data.get('tasks', [])]
-                    self.next_id = data.get('next_id', 1)
-            except Exception as e:
-                print(f"⚠️  Error cargando tareas: {e}")
+        """Carga tareas desde archivo (con el bloqueo: no reemplaza el estado en medio de una transacción)"""
+        with self.lock:
+            self._file_stamp = self._stat_file()
+            if self.tasks_file.exists():
+                try:
+                    with open(self.tasks_file, 'r', encoding='utf-8') as f:
+                        data = json.load(f)
+                        self.tasks = [Task.from_dict(t) for t in data.get('tasks', [])]
+                        self.next_id = data.get('next_id', 1)
+                except Exception as e:
+                    print(f"⚠️  Error cargando tareas: {e}")
+                    self.tasks = []
+                    self.next_id = 1
+            else:
                 self.tasks = []
                 self.next_id = 1
     
+    def refresh_if_changed(self) -> bool:
+        """
+        Recarga las tareas solo si otro proceso modificó el archivo
+        
+        Returns:
+            True si se recargaron
+        """
+        with self.lock:
+            if self._stat_file() == self._file_stamp:
+                return False
+            self.load_tasks()
+            return True
+    
     def save_tasks(self):
         """Guarda tareas en archivo"""
         try:
             data = {
-                'tasks': [t.to_dict() for t in self.tasks],
+                'tasks': [t.to_row() for t in self.tasks],
                 'next_id': self.next_id
             }
-            with open(self.tasks_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
+            self._write_atomic(self.tasks_file, data)
+            self._file_stamp = self._stat_file()
         except Exception as e:
             print(f"⚠️  Error guardando tareas: {e}")
     
-    def add_task(self, description: str) -> Task:
-        """Agrega una nueva tarea"""
-        task = Task(id=self.next_id, description=description)
-        self.tasks.append(task)
-        self.next_id += 1
+    @staticmethod
+    def _write_atomic(path: Path, data: dict):
+        """
+        Escribe en un archivo temporal y lo renombra: nunca queda un JSON a medias
+        
+        JSON compacto en una sola escritura: con indent, json usa el codificador
+        en Python puro, varias veces más lento con muchas tareas.
+        """
+        tmp_file = Path(f"{path}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(data, ensure_ascii=False, separators=(',', ':')))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, path)
+    
+    def _transaction(self, apply):
+        """
+        Ejecuta una modificación de forma segura entre procesos
+        
+        Toma el bloqueo, recarga si otro proceso escribió, aplica el cambio y lo
+        persiste. Si al persistir se detecta una escritura sin bloqueo (control
+        optimista sobre la firma del archivo, y con ella next_id), recarga y reintenta.
+        
+        Args:
+            apply: Función sin argumentos que modifica el estado y llama a _commit
+        """
+        for _ in range(self.MAX_RETRIES):
+            with self.lock:
+                self.refresh_if_changed()
+                self._outbox = []
+                try:
+                    result = apply()
+                except ConcurrentModificationError:
+                    self.load_tasks()
+                    continue
+                events, self._outbox = self._outbox, []
+            self._publish_outbox(events)
+            return result
+        raise ConcurrentModificationError(f"No se pudo guardar {self.tasks_file}")
+    
+    def _check_unchanged(self):
+        """Verifica que nadie escribió desde la última carga"""
+        if self._stat_file() != self._file_stamp:
+            raise ConcurrentModificationError(f"{self.tasks_file} cambió durante la operación")
+    
+    def _commit(self, op: str, **data):
+        """
+        Persiste una operación ya aplicada en memoria
+        
+        Args:
+            op: Tipo de operación ('add', 'complete', 'delete', 'assign', 'schedule',
+                'depends', 'lease', 'clear_completed', 'archive', 'batch')
+            **data: Datos de la operación (usados por el modo con journal y los eventos)
+        """
+        self._check_unchanged()
         self.save_tasks()
-        return task
+        self._record_events(op, data)
+    
+    def add_task(self, description: str, priority: int = 0, due_at=None, recurrence=None,
+                 depends_on=None) -> Task:
+        """
+        Agrega una nueva tarea
+        
+        Args:
+            description: Descripción de la tarea
+            priority: Prioridad (mayor número = más urgente)
+            due_at: Vencimiento (epoch, ISO o relativo como '+30m')
+            recurrence: Repetición ('1h', '1d', 'weekly' o segundos)
+            depends_on: IDs de tareas que deben completarse antes
+        
+        Raises:
+            DependencyError: Si alguna dependencia no existe
+        """
+        def apply():
+            task = Task(id=self.next_id, description=description, priority=priority,
+                        due_at=due_at, recurrence=recurrence, depends_on=depends_on)
+            self._check_dependencies(task.id, task.depends_on)
+            self._index_add(task)
+            self.next_id += 1
+            self._commit('add', task=task.to_row())
+            return task
+        return self._transaction(apply)
+    
+    def _complete_ops(self, task: Task) -> List[dict]:
+        """Completa una tarea en memoria y crea su siguiente repetición si es recurrente"""
+        task.complete()
+        self._index_complete(task)
+        ops = [{'op': 'complete', 'id': task.id, 'completed_at': task.completed_ts}]
+        
+        next_task = task.next_occurrence()
+        if next_task:
+            next_task.id = self.next_id
+            self.next_id += 1
+            self._index_add(next_task)
+            ops.append({'op': 'add', 'task': next_task.to_row()})
+        return ops
     
     def complete_task(self, task_id: int) -> bool:
-        """Marca una tarea como completada"""
-        for task in self.tasks:
-            if task.id == task_id and not task.completed:
-                task.complete()
-                self.save_tasks()
-                return True
-        return False
+        """Marca una tarea como completada (las recurrentes se reprograman)"""
+        def apply():
+            task = self._by_id.get(task_id)
+            if task is None or task.completed:
+                return False
+            ops = self._complete_ops(task)
+            if len(ops) == 1:
+                self._commit('complete', id=task_id, completed_at=task.completed_ts)
+            else:
+                self._commit('batch', ops=ops)
+            return True
+        return self._transaction(apply)
+    
+    def schedule_task(self, task_id: int, priority: int = None, due_at=None, recurrence=None) -> bool:
+        """
+        Cambia prioridad, vencimiento o recurrencia de una tarea (None = sin cambios)
+        """
+        def apply():
+            task = self._by_id.get(task_id)
+            if task is None:
+                return False
+            if priority is not None:
+                task.priority = int(priority)
+            if due_at is not None:
+                task.due_at = due_at
+            if recurrence is not None:
+                task.recurrence = parse_interval(recurrence)
+            if task.due_ts is not None and not task.completed:
+                heapq.heappush(self._due_heap, (task.due_ts, -task.priority, task.id))
+            self._commit('schedule', id=task_id, priority=task.priority,
+                         due_at=task.due_ts, recurrence=task.recurrence)
+            return True
+        return self._transaction(apply)
+    
+    def _check_dependencies(self, task_id: int, depends_on: tuple):
+        """
+        Valida dependencias antes de guardarlas
+        
+        Raises:
+            DependencyError: Si una dependencia no existe o si se formaría un ciclo
+        """
+        missing = [dep_id for dep_id in depends_on if dep_id not in self._by_id]
+        if missing:
+            raise DependencyError(f"Dependencias inexistentes: {missing}")
+        
+        # Ciclo: task_id es alcanzable siguiendo depends_on desde sus nuevas dependencias
+        stack, seen = list(depends_on), set()
+        while stack:
+            dep_id = stack.pop()
+            if dep_id == task_id:
+                raise DependencyError(f"La tarea #{task_id} formaría un ciclo de dependencias")
+            if dep_id in seen:
+                continue
+            seen.add(dep_id)
+            dep = self._by_id.get(dep_id)
+            if dep:
+                stack.extend(dep.depends_on)
+    
+    def set_dependencies(self, task_id: int, depends_on) -> bool:
+        """
+        Reemplaza las dependencias de una tarea
+        
+        Raises:
+            DependencyError: Si alguna dependencia no existe o si se formaría un ciclo
+        """
+        depends_on = _parse_ids(depends_on)
+        
+        def apply():
+            task = self._by_id.get(task_id)
+            if task is None:
+                return False
+            self._check_dependencies(task_id, depends_on)
+            self._index_depends(task, depends_on)
+            self._commit('depends', id=task_id, depends_on=list(depends_on))
+            return True
+        return self._transaction(apply)
+    
+    def is_ready(self, task: Task) -> bool:
+        """
+        True si la tarea está pendiente y todas sus dependencias se completaron
+        
+        Las dependencias eliminadas (o archivadas con clear_completed) cuentan como cumplidas.
+        """
+        if task.completed:
+            return False
+        for dep_id in task.depends_on:
+            dep = self._by_id.get(dep_id)
+            if dep is not None and not dep.completed:
+                return False
+        return True
+    
+    def get_ready_tasks(self, agent_name: str = None) -> List[Task]:
+        """Tareas pendientes sin dependencias por cumplir (opcionalmente de un agente)"""
+        # Las consultas toman el bloqueo: los índices cambian desde otros hilos
+        with self.lock:
+            if agent_name:
+                candidates = self._by_agent.get(agent_name, {}).values()
+            else:
+                candidates = self._pending.values()
+            ready = [t for t in candidates if self.is_ready(t)]
+        return sorted(ready, key=lambda t: t.id)
+    
+    def get_dependents(self, task_id: int) -> List[Task]:
+        """Tareas pendientes que dependen directamente de task_id"""
+        with self.lock:
+            dependents = [t for t in self._dependents.get(task_id, {}).values() if not t.completed]
+        return sorted(dependents, key=lambda t: t.id)
+    
+    def get_due_tasks(self, now: float = None, limit: int = None) -> List[Task]:
+        """
+        Tareas pendientes ya vencidas, de mayor a menor prioridad
+        
+        Solo recorre la parte vencida del heap; las entradas obsoletas
+        (tareas completadas, eliminadas o reprogramadas) se descartan al pasar.
+        """
+        now = time.time() if now is None else now
+        due = []
+        with self.lock:
+            while self._due_heap and self._due_heap[0][0] <= now:
+                entry = heapq.heappop(self._due_heap)
+                if self._heap_entry_valid(entry) and (not due or due[-1] != entry):
+                    due.append(entry)
+            for entry in due:
+                heapq.heappush(self._due_heap, entry)
+            tasks = [self._pending[task_id] for _, _, task_id in sorted(due, key=lambda e: (e[1], e[0], e[2]))]
+        return tasks[:limit] if limit else tasks
+    
+    def next_due_time(self) -> Optional[int]:
+        """Vencimiento más próximo entre las tareas pendientes (epoch) o None"""
+        with self.lock:
+            while self._due_heap and not self._heap_entry_valid(self._due_heap[0]):
+                heapq.heappop(self._due_heap)
+            return self._due_heap[0][0] if self._due_heap else None
+    
+    # --- Concesiones (leases) ---
+    # Un trabajador reclama una tarea por lease_seconds y la mantiene con
+    # heartbeat(); si deja de hacerlo (se cayó o se colgó), la concesión vence
+    # y la tarea vuelve a estar disponible para otro trabajador.
+    
+    def _claimable(self, task: Task, now: float) -> bool:
+        """Pendiente, asignada, sin concesión vigente y con sus dependencias completadas"""
+        return bool(task.assigned_to) and not task.is_leased(now) and self.is_ready(task)
+    
+    def _lease(self, task: Task, worker_id: Optional[str], expires: Optional[int], reason: str) -> dict:
+        """Cambia la concesión de una tarea en memoria y devuelve la operación"""
+        task.leased_by = worker_id
+        task.lease_ts = expires
+        return {'op': 'lease', 'id': task.id, 'leased_by': worker_id, 'lease_expires': expires,
+                'reason': reason}
+    
+    def _commit_lease(self, task: Task, worker_id: Optional[str], expires: Optional[int], reason: str):
+        op = self._lease(task, worker_id, expires, reason)
+        del op['op']
+        self._commit('lease', **op)
+    
+    def claim_task(self, task_id: int, worker_id: str = None,
+                   lease_seconds: int = DEFAULT_LEASE_SECONDS) -> bool:
+        """
+        Reclama una tarea concreta para un trabajador
+        
+        Returns:
+            False si no existe, ya está completada, tiene dependencias pendientes
+            o la tiene reclamada otro trabajador (o este mismo)
+        """
+        worker_id = worker_id or default_worker_id()
+        
+        def apply():
+            now = time.time()
+            task = self._by_id.get(task_id)
+            if task is None or not self._claimable(task, now):
+                return False
+            self._commit_lease(task, worker_id, math.ceil(now + lease_seconds), 'claim')
+            return True
+        return self._transaction(apply)
+    
+    def claim_next(self, agent_name: str = None, worker_id: str = None,
+                   lease_seconds: int = DEFAULT_LEASE_SECONDS) -> Optional[Task]:
+        """
+        Reclama la siguiente tarea lista (mayor prioridad, luego vencimiento e ID)
+        
+        Args:
+            agent_name: Solo tareas de este agente (por defecto cualquier tarea asignada)
+            worker_id: Identificador del trabajador (por defecto host:pid)
+            lease_seconds: Duración de la concesión; extenderla con heartbeat()
+        
+        Returns:
+            La tarea reclamada, o None si no hay ninguna disponible
+        """
+        worker_id = worker_id or default_worker_id()
+        
+        def apply():
+            now = time.time()
+            candidates = self._by_agent.get(agent_name, {}).values() if agent_name else self._pending.values()
+            candidates = [t for t in candidates
+                          if (t.due_ts is None or t.due_ts <= now) and self._claimable(t, now)]
+            if not candidates:
+                return None
+            task = min(candidates, key=lambda t: (-t.priority, t.due_ts if t.due_ts is not None else float('inf'), t.id))
+            self._commit_lease(task, worker_id, math.ceil(now + lease_seconds), 'claim')
+            return task
+        return self._transaction(apply)
+    
+    def heartbeat(self, task_id: int, worker_id: str = None,
+                  lease_seconds: int = DEFAULT_LEASE_SECONDS) -> bool:
+        """
+        Extiende la concesión de una tarea reclamada por worker_id
+        
+        Returns:
+            False si la concesión ya venció o es de otro trabajador: el trabajador
+            debe dejar la tarea, que puede estar ya en manos de otro
+        """
+        worker_id = worker_id or default_worker_id()
+        
+        def apply():
+            now = time.time()
+            task = self._by_id.get(task_id)
+            if task is None or not task.is_leased(now) or task.leased_by != worker_id:
+                return False
+            self._commit_lease(task, worker_id, math.ceil(now + lease_seconds), 'heartbeat')
+            return True
+        return self._transaction(apply)
+    
+    def release(self, task_id: int, worker_id: str = None) -> bool:
+        """Devuelve a la cola una tarea reclamada por worker_id sin completarla"""
+        worker_id = worker_id or default_worker_id()
+        
+        def apply():
+            task = self._by_id.get(task_id)
+            if task is None or task.completed or task.leased_by != worker_id:
+                return False
+            self._commit_lease(task, None, None, 'release')
+            return True
+        return self._transaction(apply)
+    
+    def requeue_expired(self, now: float = None) -> List[int]:
+        """
+        Libera las concesiones vencidas (trabajadores caídos)
+        
+        claim_next ya ignora las concesiones vencidas; esto además limpia el
+        store y publica un evento 'requeued' por tarea.
+        
+        Returns:
+            IDs de las tareas devueltas a la cola
+        """
+        def apply():
+            current = time.time() if now is None else now
+            expired = [t for t in self._pending.values()
+                       if t.leased_by and t.lease_ts is not None and t.lease_ts <= current]
+            if not expired:
+                return []
+            self._commit('batch', ops=[self._lease(t, None, None, 'expired') for t in expired])
+            return sorted(t.id for t in expired)
+        return self._transaction(apply)
     
     def get_task(self, task_id: int) -> Optional[Task]:
         """Obtiene una tarea por ID"""
-        for task in self.tasks:
-            if task.id == task_id:
-                return task
-        return None
+        return self._by_id.get(task_id)
     
     def get_pending_tasks(self) -> List[Task]:
         """Obtiene todas las tareas pendientes"""
-        return [t for t in self.tasks if not t.completed]
+        with self.lock:
+            return list(self._pending.values())
     
     def get_completed_tasks(self) -> List[Task]:
         """Obtiene todas las tareas completadas"""
-        return [t for t in self.tasks if t.completed]
+        with self.lock:
+            completed = list(self._completed.values())
+        return sorted(completed, key=lambda t: t.id)
     
     def delete_task(self, task_id: int) -> bool:
         """Elimina una tarea"""
-        for i, task in enumerate(self.tasks):
-            if task.id == task_id:
-                self.tasks.pop(i)
-                self.save_tasks()
-                return True
-        return False
+        def apply():
+            task = self._by_id.get(task_id)
+            if task is None:
+                return False
+            self._index_remove(task)
+            self._commit('delete', id=task_id)
+            return True
+        return self._transaction(apply)
     
     def clear_completed(self):
         """Elimina todas las tareas completadas"""
-        self.tasks = [t for t in self.tasks if not t.completed]
-        self.save_tasks()
+        def apply():
+            completed = list(self._completed.values())
+            for task in completed:
+                self._index_remove(task)
+            self._commit('clear_completed', ids=[t.id for t in completed])
+        self._transaction(apply)
+    
+    @staticmethod
+    def _select_for_archive(completed: List[Task], older_than=None, keep_last: int = None,
+                            now: float = None) -> List[Task]:
+        """
+        Elige qué tareas completadas archivar
+        
+        Args:
+            completed: Tareas completadas, de la más antigua a la más reciente
+            older_than: Solo las completadas hace más de este intervalo ('7d', segundos...)
+            keep_last: Dejar en el store las N completadas más recientes
+            now: Momento de referencia (por defecto ahora)
+        
+        Sin criterios se archivan todas; con ambos, deben cumplirse los dos.
+        """
+        if keep_last is not None:
+            completed = completed[:max(0, len(completed) - keep_last)]
+        seconds = parse_interval(older_than)
+        if seconds is not None:
+            cutoff = (now if now is not None else time.time()) - seconds
+            completed = [t for t in completed if (t.completed_ts or t.created_ts) <= cutoff]
+        return completed
+    
+    def archive_completed(self, archive, older_than=None, keep_last: int = None) -> int:
+        """
+        Mueve tareas completadas al archivo histórico (ver task_archive.TaskArchive)
+        
+        Las tareas se escriben en el archivo antes de quitarlas del store, con el
+        bloqueo tomado; si el proceso se interrumpe entre ambos pasos, la tarea
+        queda duplicada (el archivo conserva la última copia), nunca perdida.
+        
+        Args:
+            archive: Destino con write(tasks)
+            older_than: Solo las completadas hace más de este intervalo ('7d', '12h', segundos)
+            keep_last: Dejar en el store las N completadas más recientes
+        
+        Returns:
+            Número de tareas archivadas
+        """
+        def apply():
+            completed = sorted(self._completed.values(), key=lambda t: (t.completed_ts or t.created_ts, t.id))
+            selected = self._select_for_archive(completed, older_than, keep_last)
+            if not selected:
+                return 0
+            archive.write(selected)
+            for task in selected:
+                self._index_remove(task)
+            self._commit('archive', ids=[t.id for t in selected])
+            return len(selected)
+        return self._transaction(apply)
     
     def assign_task(self, task_id: int, agent_name: str) -> bool:
         """Asigna una tarea a un agente"""
-        for task in self.tasks:
-            if task.id == task_id:
-                task.assigned_to = agent_name
-                self.save_tasks()
-                return True
-        return False
+        def apply():
+            task = self._by_id.get(task_id)
+            if task is None:
+                return False
+            self._index_assign(task, agent_name)
+            self._commit('assign', id=task_id, agent=agent_name)
+            return True
+        return self._transaction(apply)
+    
+    def add_tasks(self, descriptions: List[str], agent_name: str = None) -> List[Task]:
+        """
+        Agrega varias tareas con una sola escritura
+        
+        Args:
+            descriptions: Descripciones de las tareas
+            agent_name: Agente al que asignarlas (opcional)
+        """
+        def apply():
+            tasks = []
+            for description in descriptions:
+                task = Task(id=self.next_id, description=description, assigned_to=agent_name)
+                self._index_add(task)
+                self.next_id += 1
+                tasks.append(task)
+            self._commit('batch', ops=[{'op': 'add', 'task': t.to_row()} for t in tasks])
+            return tasks
+        return self._transaction(apply)
+    
+    def complete_tasks(self, task_ids: List[int]) -> List[int]:
+        """
+        Completa varias tareas con una sola escritura
+        
+        Returns:
+            IDs que se completaron (se omiten los inexistentes o ya completados)
+        """
+        def apply():
+            ops = []
+            for task_id in task_ids:
+                task = self._by_id.get(task_id)
+                if task is None or task.completed:
+                    continue
+                ops.extend(self._complete_ops(task))
+            if ops:
+                self._commit('batch', ops=ops)
+            return [op['id'] for op in ops if op['op'] == 'complete']
+        return self._transaction(apply)
+    
+    def assign_tasks(self, task_ids: List[int], agent_name: str) -> List[int]:
+        """
+        Asigna varias tareas a un agente con una sola escritura
+        
+        Returns:
+            IDs asignados (se omiten los inexistentes)
+        """
+        def apply():
+            ops = []
+            for task_id in task_ids:
+                task = self._by_id.get(task_id)
+                if task is None:
+                    continue
+                self._index_assign(task, agent_name)
+                ops.append({'op': 'assign', 'id': task_id, 'agent': agent_name})
+            if ops:
+                self._commit('batch', ops=ops)
+            return [op['id'] for op in ops]
+        return self._transaction(apply)
     
     def get_tasks_by_agent(self, agent_name: str) -> List[Task]:
         """Obtiene todas las tareas asignadas a un agente"""
-        return [t for t in self.tasks if t.assigned_to == agent_name]
+        with self.lock:
+            agent_tasks = list(self._by_agent.get(agent_name, {}).values())
+        return sorted(agent_tasks, key=lambda t: t.id)
     
     def get_agents_with_tasks(self) -> List[str]:
         """Obtiene lista de agentes que tienen tareas asignadas"""
-        agents = set()
-        for task in self.tasks:
-            if task.assigned_to:
-                agents.add(task.assigned_to)
-        return sorted(list(agents))
-    
-    def get_summary(self) -> dict:
-        """Obtiene un resumen de las tareas"""
-        total = len(self.tasks)
-        completed = len(self.get_completed_tasks())
-        pending = len(self.get_pending_tasks())
+        with self.lock:
+            agents = list(self._by_agent)
+        return sorted(agents)
+    
+    def query_tasks(self, status: str = 'all', agent_name: str = None, text: str = None,
+                    after_id: int = 0, limit: int = None) -> List[Task]:
+        """
+        Consulta filtrada y paginada por ID (cursor = último ID de la página anterior)
+        
+        Args:
+            status: 'pending', 'ready' (pendientes sin dependencias por cumplir),
+                'completed' o 'all'
+            agent_name: Solo tareas de este agente (opcional)
+            text: Texto a buscar en la descripción, sin distinguir mayúsculas (opcional)
+            after_id: Devolver solo tareas con ID mayor
+            limit: Máximo de tareas (opcional)
+        """
+        if status not in TASK_STATUSES:
+            raise ValueError(f"Estado inválido: {status} (usa {', '.join(TASK_STATUSES)})")
+        
+        with self.lock:
+            if agent_name:
+                source = list(self._by_agent.get(agent_name, {}).values())
+            elif status == 'completed':
+                source = list(self._completed.values())
+            elif status in ('pending', 'ready'):
+                source = list(self._pending.values())
+            else:
+                source = list(self._by_id.values())
+        source.sort(key=lambda t: t.id)
+        
+        text = text.lower() if text else None
+        tasks = []
+        for task in source:
+            if task.id <= after_id:
+                continue
+            if status == 'completed' and not task.completed:
+                continue
+            if status == 'pending' and task.completed:
+                continue
+            if status == 'ready' and not self.is_ready(task):
+                continue
+            if text and text not in task.description.lower():
+                continue
+            tasks.append(task)
+            if limit and len(tasks) >= limit:
+                break
+        return tasks
+    
+    def get_summary(self, agent_name: str = None) -> dict:
+        """Obtiene un resumen de las tareas (de todas o solo las de un agente)"""
+        with self.lock:
+            if agent_name:
+                agent_tasks = list(self._by_agent.get(agent_name, {}).values())
+                total = len(agent_tasks)
+                completed = sum(1 for t in agent_tasks if t.completed)
+            else:
+                total = len(self._by_id)
+                completed = len(self._completed)
+        pending = total - completed
         
         return {
             'total': total,
@@ -200,22 +1155,793 @@ class TaskManager:
         print("=" * 70)
 
 
+class JournaledTaskManager(TaskManager):
+    """
+    Gestor de tareas en archivo con journal (write-ahead log)
+    
+    Cada cambio agrega una línea JSON a tasks.json.log en lugar de reescribir
+    tasks.json. Cuando el log supera compact_threshold bytes, un hilo en segundo
+    plano lo integra en el snapshot (tasks.json) y lo vacía. Escrituras y
+    compactación usan el mismo bloqueo entre procesos que TaskManager.
+    """
+    
+    def __init__(self, tasks_file: str = "tasks.json", compact_threshold: int = 512 * 1024,
+                 event_log=None):
+        """
+        Args:
+            tasks_file: Snapshot de tareas (mismo formato que TaskManager)
+            compact_threshold: Tamaño del log (bytes) que dispara la compactación
+            event_log: Log de eventos (ver TaskManager)
+        """
+        self.journal_file = Path(f"{tasks_file}.log")
+        self.compacting_file = Path(f"{tasks_file}.log.compacting")
+        self.compact_threshold = compact_threshold
+        self._compactor = None
+        super().__init__(tasks_file, event_log=event_log)
+    
+    def _stat_file(self):
+        """Firma del snapshot y del log"""
+        stamps = []
+        for path in (self.tasks_file, self.journal_file):
+            try:
+                stat = os.stat(path)
+                stamps.append((stat.st_mtime_ns, stat.st_size))
+            except FileNotFoundError:
+                stamps.append(None)
+        return tuple(stamps)
+    
+    def load_tasks(self):
+        """Carga el snapshot y reaplica el log (incluido uno a medio compactar)"""
+        with self.lock:
+            super().load_tasks()
+            for path in (self.compacting_file, self.journal_file):
+                if path.exists():
+                    self._replay(path)
+            self._file_stamp = self._stat_file()
+    
+    def _replay(self, path: Path):
+        """Reaplica las operaciones de un log"""
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # Última línea incompleta tras un cierre inesperado
+                self._apply(entry)
+    
+    def _apply(self, entry: dict):
+        """Aplica una operación del log al estado en memoria (idempotente)"""
+        op = entry.get('op')
+        if op == 'add':
+            task = Task.from_dict(entry['task'])
+            existing = self.get_task(task.id)
+            if existing:
+                self._index_remove(existing)
+            self._index_add(task)
+            self.next_id = max(self.next_id, task.id + 1)
+        elif op == 'complete':
+            task = self.get_task(entry['id'])
+            if task:
+                task.complete()
+                task.completed_at = entry.get('completed_at')
+                self._index_complete(task)
+        elif op == 'assign':
+            task = self.get_task(entry['id'])
+            if task:
+                self._index_assign(task, entry.get('agent'))
+        elif op == 'depends':
+            task = self.get_task(entry['id'])
+            if task:
+                self._index_depends(task, _parse_ids(entry.get('depends_on')))
+        elif op == 'schedule':
+            task = self.get_task(entry['id'])
+            if task:
+                task.priority = entry.get('priority') or 0
+                task.due_at = entry.get('due_at')
+                task.recurrence = entry.get('recurrence')
+                if task.due_ts is not None and not task.completed:
+                    heapq.heappush(self._due_heap, (task.due_ts, -task.priority, task.id))
+        elif op == 'lease':
+            task = self.get_task(entry['id'])
+            if task:
+                task.leased_by = entry.get('leased_by')
+                task.lease_ts = entry.get('lease_expires')
+        elif op == 'delete':
+            task = self.get_task(entry['id'])
+            if task:
+                self._index_remove(task)
+        elif op == 'clear_completed':
+            for task in list(self._completed.values()):
+                self._index_remove(task)
+        elif op == 'archive':
+            for task_id in entry.get('ids', []):
+                task = self.get_task(task_id)
+                if task:
+                    self._index_remove(task)
+        elif op == 'batch':
+            for sub_entry in entry.get('ops', []):
+                self._apply(sub_entry)
+    
+    def _commit(self, op: str, **data):
+        """Agrega la operación al log y compacta si es necesario"""
+        line = json.dumps({'op': op, **data}, ensure_ascii=False, separators=(',', ':'))
+        with self.lock:
+            self._check_unchanged()
+            try:
+                with open(self.journal_file, 'a', encoding='utf-8') as f:
+                    f.write(line + "\n")
+                self._file_stamp = self._stat_file()
+            except Exception as e:
+                print(f"⚠️  Error guardando tareas: {e}")
+                return
+            self._record_events(op, data)
+            
+            journal_size = self._file_stamp[1][1] if self._file_stamp[1] else 0
+            if journal_size >= self.compact_threshold and not self._compacting():
+                self._compactor = threading.Thread(target=self.compact, daemon=True)
+                self._compactor.start()
+    
+    def _compacting(self) -> bool:
+        return self._compactor is not None and self._compactor.is_alive()
+    
+    def compact(self):
+        """Integra el log en el snapshot"""
+        with self.lock:
+            # Incluir lo que otros procesos hayan agregado al log
+            self.refresh_if_changed()
+            
+            # Si el proceso muere a mitad, el log renombrado se reaplica al cargar
+            if self.journal_file.exists():
+                os.replace(self.journal_file, self.compacting_file)
+            data = {
+                'tasks': [t.to_row() for t in self.tasks],
+                'next_id': self.next_id
+            }
+            self._write_atomic(self.tasks_file, data)
+            if self.compacting_file.exists():
+                self.compacting_file.unlink()
+            self._file_stamp = self._stat_file()
+    
+    def save_tasks(self):
+        """Escribe un snapshot completo (compactación síncrona)"""
+        self.compact()
+
+
+class SQLiteTaskManager(TaskManager):
+    """
+    Gestor de tareas con almacenamiento SQLite
+    
+    Misma API que TaskManager, pero cada operación es una consulta indexada
+    o una transacción de una sola fila en lugar de reescribir todo el archivo.
+    """
+    
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS tasks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            description TEXT NOT NULL,
+            completed INTEGER NOT NULL DEFAULT 0,
+            created_at INTEGER,
+            completed_at INTEGER,
+            assigned_to TEXT,
+            priority INTEGER NOT NULL DEFAULT 0,
+            due_at INTEGER,
+            recurrence INTEGER,
+            depends_on TEXT,
+            leased_by TEXT,
+            lease_expires INTEGER
+        );
+        CREATE INDEX IF NOT EXISTS idx_tasks_assigned_to ON tasks(assigned_to);
+        CREATE INDEX IF NOT EXISTS idx_tasks_completed ON tasks(completed);
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+    """
+    
+    def __init__(self, db_file: str = "tasks.db", json_file: str = "tasks.json", event_log=None):
+        """
+        Args:
+            db_file: Archivo de la base de datos SQLite
+            json_file: tasks.json existente a importar la primera vez (migración)
+            event_log: Log de eventos: ruta, o True para <db_file>.events.jsonl (ver TaskManager)
+        """
+        self.db_file = Path(db_file)
+        self.lock = threading.Lock()
+        self._init_events(f"{db_file}.events.jsonl" if event_log is True else event_log)
+        self.conn = sqlite3.connect(str(self.db_file), check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        with self.lock:
+            self.conn.executescript(self.SCHEMA)
+            with self.conn:
+                # Bloqueo de escritura: dos procesos no agregan la misma columna
+                self.conn.execute("BEGIN IMMEDIATE")
+                self._upgrade_schema()
+        
+        if json_file and Path(json_file).exists():
+            self.migrate_from_json(json_file)
+    
+    # Columnas agregadas después de la primera versión del esquema
+    ADDED_COLUMNS = {
+        'priority': "INTEGER NOT NULL DEFAULT 0",
+        'due_at': "INTEGER",
+        'recurrence': "INTEGER",
+        'depends_on': "TEXT",  # Lista JSON de IDs
+        'leased_by': "TEXT",
+        'lease_expires': "INTEGER",
+    }
+    
+    def _upgrade_schema(self):
+        """Agrega columnas nuevas a bases de datos creadas con un esquema anterior"""
+        columns = {row['name'] for row in self.conn.execute("PRAGMA table_info(tasks)")}
+        for name, definition in self.ADDED_COLUMNS.items():
+            if name not in columns:
+                self.conn.execute(f"ALTER TABLE tasks ADD COLUMN {name} {definition}")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_due ON tasks(completed, due_at)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_lease ON tasks(completed, lease_expires)")
+    
+    def migrate_from_json(self, json_file: str) -> int:
+        """
+        Importa tasks.json una sola vez (se registra en la tabla meta)
+        
+        La marca se inserta primero, en la misma transacción que la importación:
+        si varios procesos arrancan a la vez, solo el que la inserta importa.
+        
+        Returns:
+            Número de tareas importadas
+        """
+        with self.lock:
+            if self.conn.execute("SELECT 1 FROM meta WHERE key = 'migrated_json'").fetchone():
+                return 0
+            
+            legacy = TaskManager(json_file, event_log=False)
+            with self.conn:
+                claimed = self.conn.execute(
+                    "INSERT OR IGNORE INTO meta (key, value) VALUES ('migrated_json', ?)", (str(json_file),)
+                )
+                if claimed.rowcount == 0:
+                    return 0  # Otro proceso ya importó
+                self.conn.executemany(
+                    "INSERT OR IGNORE INTO tasks (id, description, completed, created_at, completed_at, "
+                    "assigned_to, priority, due_at, recurrence, depends_on) "
+                    "VALUES (:id, :description, :completed, :created_at, :completed_at, "
+                    ":assigned_to, :priority, :due_at, :recurrence, :depends_on)",
+                    [self._to_db_row(t) for t in legacy.tasks]
+                )
+                # Conservar next_id para no reutilizar IDs de tareas eliminadas
+                if legacy.next_id > 1:
+                    self.conn.execute("DELETE FROM sqlite_sequence WHERE name = 'tasks'")
+                    self.conn.execute(
+                        "INSERT INTO sqlite_sequence (name, seq) VALUES ('tasks', "
+                        "(SELECT MAX(?, COALESCE(MAX(id), 0)) FROM tasks))",
+                        (legacy.next_id - 1,)
+                    )
+        
+        print(f"✓ {len(legacy.tasks)} tareas importadas de {json_file} a {self.db_file}")
+        return len(legacy.tasks)
+    
+    def _query(self, sql: str, params: tuple = ()) -> List[Task]:
+        """Ejecuta una consulta y convierte las filas en tareas"""
+        with self.lock:
+            rows = self.conn.execute(sql, params).fetchall()
+        return [self._row_to_task(row) for row in rows]
+    
+    @staticmethod
+    def _to_db_row(task: Task) -> dict:
+        """Fila para INSERT (depends_on como JSON)"""
+        row = task.to_row()
+        row['depends_on'] = json.dumps(row['depends_on']) if row['depends_on'] else None
+        return row
+    
+    @staticmethod
+    def _row_to_task(row) -> Task:
+        data = dict(row)
+        data['completed'] = bool(data['completed'])
+        return Task.from_dict(data)
+    
+    @property
+    def tasks(self) -> List[Task]:
+        """Todas las tareas (compatibilidad con TaskManager.tasks)"""
+        return self._query("SELECT * FROM tasks ORDER BY id")
+    
+    @property
+    def next_id(self) -> int:
+        with self.lock:
+            row = self.conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'tasks'").fetchone()
+        return (row['seq'] if row else 0) + 1
+    
+    def load_tasks(self):
+        """No-op: SQLite se consulta directamente"""
+    
+    def save_tasks(self):
+        """No-op: cada operación se guarda en su propia transacción"""
+    
+    def refresh_if_changed(self) -> bool:
+        """No-op: las consultas siempre leen el estado actual"""
+        return False
+    
+    def _insert(self, task: Task) -> Task:
+        """Inserta una tarea nueva (llamar con el bloqueo y la transacción abiertos)"""
+        row = self._to_db_row(task)
+        del row['id']
+        task.id = self.conn.execute(
+            "INSERT INTO tasks (description, completed, created_at, completed_at, assigned_to, "
+            "priority, due_at, recurrence, depends_on) VALUES (:description, :completed, "
+            ":created_at, :completed_at, :assigned_to, :priority, :due_at, :recurrence, :depends_on)",
+            row
+        ).lastrowid
+        return task
+    
+    def _emit(self, ops: List[dict]):
+        """Registra y publica los eventos de operaciones ya confirmadas en la base de datos"""
+        events = [event for op in ops for event in self._op_events(op['op'], op)]
+        if self.event_log:
+            self.event_log.append(events)
+        self._publish_outbox(events)
+    
+    def _complete(self, task_id: int, now: int) -> List[dict]:
+        """
+        Completa una tarea y reprograma las recurrentes (con el bloqueo y la transacción abiertos)
+        
+        Returns:
+            Operaciones realizadas (vacío si la tarea no existe o ya estaba completada)
+        """
+        row = self.conn.execute(
+            "SELECT * FROM tasks WHERE id = ? AND completed = 0", (task_id,)
+        ).fetchone()
+        if row is None:
+            return []
+        self.conn.execute(
+            "UPDATE tasks SET completed = 1, completed_at = ?, leased_by = NULL, lease_expires = NULL "
+            "WHERE id = ?", (now, task_id)
+        )
+        ops = [{'op': 'complete', 'id': task_id, 'completed_at': now}]
+        next_task = self._row_to_task(row).next_occurrence(now)
+        if next_task:
+            self._insert(next_task)
+            ops.append({'op': 'add', 'task': next_task.to_row()})
+        return ops
+    
+    def add_task(self, description: str, priority: int = 0, due_at=None, recurrence=None,
+                 depends_on=None) -> Task:
+        """Agrega una nueva tarea"""
+        task = Task(id=None, description=description, priority=priority,
+                    due_at=due_at, recurrence=recurrence, depends_on=depends_on)
+        with self.lock, self.conn:
+            self._check_dependencies(None, task.depends_on)
+            self._insert(task)
+        self._emit([{'op': 'add', 'task': task.to_row()}])
+        return task
+    
+    def _check_dependencies(self, task_id: Optional[int], depends_on: tuple):
+        """Valida dependencias (con el bloqueo abierto); ver TaskManager._check_dependencies"""
+        if not depends_on:
+            return
+        ids = json.dumps(list(depends_on))
+        found = {row['id'] for row in self.conn.execute(
+            "SELECT id FROM tasks WHERE id IN (SELECT value FROM json_each(?))", (ids,)
+        )}
+        missing = [dep_id for dep_id in depends_on if dep_id not in found]
+        if missing:
+            raise DependencyError(f"Dependencias inexistentes: {missing}")
+        
+        if task_id is not None:
+            # Todas las tareas alcanzables siguiendo depends_on desde las nuevas dependencias
+            cycle = self.conn.execute(
+                "WITH RECURSIVE upstream(id) AS ("
+                "  SELECT value FROM json_each(?)"
+                "  UNION SELECT d.value FROM tasks t JOIN upstream u ON t.id = u.id, json_each(t.depends_on) d"
+                ") SELECT 1 FROM upstream WHERE id = ?",
+                (ids, task_id)
+            ).fetchone()
+            if cycle:
+                raise DependencyError(f"La tarea #{task_id} formaría un ciclo de dependencias")
+    
+    def set_dependencies(self, task_id: int, depends_on) -> bool:
+        """Reemplaza las dependencias de una tarea (rechaza ciclos)"""
+        depends_on = _parse_ids(depends_on)
+        with self.lock, self.conn:
+            self._check_dependencies(task_id, depends_on)
+            cursor = self.conn.execute(
+                "UPDATE tasks SET depends_on = ? WHERE id = ?",
+                (json.dumps(list(depends_on)) if depends_on else None, task_id)
+            )
+        if cursor.rowcount > 0:
+            self._emit([{'op': 'depends', 'id': task_id, 'depends_on': list(depends_on)}])
+        return cursor.rowcount > 0
+    
+    # Pendiente y sin dependencias pendientes (las eliminadas cuentan como cumplidas)
+    READY_SQL = (
+        "SELECT * FROM tasks t WHERE t.completed = 0 AND NOT EXISTS ("
+        "  SELECT 1 FROM json_each(t.depends_on) d JOIN tasks p ON p.id = d.value WHERE p.completed = 0"
+        ")"
+    )
+    
+    def is_ready(self, task: Task) -> bool:
+        """True si la tarea está pendiente y todas sus dependencias se completaron"""
+        return bool(self._query(self.READY_SQL + " AND t.id = ?", (task.id,)))
+    
+    def get_ready_tasks(self, agent_name: str = None) -> List[Task]:
+        """Tareas pendientes sin dependencias por cumplir (opcionalmente de un agente)"""
+        if agent_name:
+            return self._query(self.READY_SQL + " AND t.assigned_to = ? ORDER BY t.id", (agent_name,))
+        return self._query(self.READY_SQL + " ORDER BY t.id")
+    
+    def get_dependents(self, task_id: int) -> List[Task]:
+        """Tareas pendientes que dependen directamente de task_id"""
+        return self._query(
+            "SELECT * FROM tasks t WHERE t.completed = 0 AND EXISTS ("
+            "  SELECT 1 FROM json_each(t.depends_on) d WHERE d.value = ?"
+            ") ORDER BY t.id",
+            (task_id,)
+        )
+    
+    def complete_task(self, task_id: int) -> bool:
+        """Marca una tarea como completada (las recurrentes se reprograman)"""
+        with self.lock, self.conn:
+            ops = self._complete(task_id, int(time.time()))
+        self._emit(ops)
+        return bool(ops)
+    
+    def schedule_task(self, task_id: int, priority: int = None, due_at=None, recurrence=None) -> bool:
+        """Cambia prioridad, vencimiento o recurrencia de una tarea (None = sin cambios)"""
+        with self.lock, self.conn:
+            cursor = self.conn.execute(
+                "UPDATE tasks SET priority = COALESCE(?, priority), due_at = COALESCE(?, due_at), "
+                "recurrence = COALESCE(?, recurrence) WHERE id = ?",
+                (priority, parse_due(due_at), parse_interval(recurrence), task_id)
+            )
+            row = self.conn.execute(
+                "SELECT priority, due_at, recurrence FROM tasks WHERE id = ?", (task_id,)
+            ).fetchone()
+        if row is None:
+            return False
+        self._emit([{'op': 'schedule', 'id': task_id, **dict(row)}])
+        return True
+    
+    # Concesiones: cada cambio es un UPDATE condicional (compare-and-set), así
+    # varios procesos sobre la misma base de datos nunca reclaman la misma tarea
+    CLAIMABLE_SQL = READY_SQL + (
+        " AND t.assigned_to IS NOT NULL AND (t.leased_by IS NULL OR t.lease_expires <= :now)"
+    )
+    
+    def _try_claim(self, task_id: int, worker_id: str, now: float, lease_seconds: int) -> bool:
+        """Reclama una tarea si sigue disponible (con el bloqueo y la transacción abiertos)"""
+        expires = math.ceil(now + lease_seconds)
+        cursor = self.conn.execute(
+            "UPDATE tasks SET leased_by = :worker, lease_expires = :expires "
+            "WHERE id = :id AND id IN (SELECT t.id FROM (" + self.CLAIMABLE_SQL + " AND t.id = :id) t)",
+            {'worker': worker_id, 'expires': expires, 'id': task_id, 'now': now}
+        )
+        return cursor.rowcount > 0
+    
+    def claim_task(self, task_id: int, worker_id: str = None,
+                   lease_seconds: int = DEFAULT_LEASE_SECONDS) -> bool:
+        """Reclama una tarea concreta (ver TaskManager.claim_task)"""
+        worker_id = worker_id or default_worker_id()
+        with self.lock, self.conn:
+            now = time.time()
+            claimed = self._try_claim(task_id, worker_id, now, lease_seconds)
+        if claimed:
+            self._emit([{'op': 'lease', 'id': task_id, 'leased_by': worker_id,
+                         'lease_expires': math.ceil(now + lease_seconds), 'reason': 'claim'}])
+        return claimed
+    
+    def claim_next(self, agent_name: str = None, worker_id: str = None,
+                   lease_seconds: int = DEFAULT_LEASE_SECONDS) -> Optional[Task]:
+        """Reclama la siguiente tarea lista (ver TaskManager.claim_next)"""
+        worker_id = worker_id or default_worker_id()
+        sql = self.CLAIMABLE_SQL + " AND (t.due_at IS NULL OR t.due_at <= :now)"
+        if agent_name:
+            sql += " AND t.assigned_to = :agent"
+        sql += " ORDER BY t.priority DESC, t.due_at IS NULL, t.due_at, t.id LIMIT 10"
+        
+        with self.lock, self.conn:
+            now = time.time()
+            # Otro proceso puede ganar alguna candidata entre la consulta y el UPDATE
+            for row in self.conn.execute(sql, {'now': now, 'agent': agent_name}).fetchall():
+                if self._try_claim(row['id'], worker_id, now, lease_seconds):
+                    task = self._row_to_task(
+                        self.conn.execute("SELECT * FROM tasks WHERE id = ?", (row['id'],)).fetchone()
+                    )
+                    break
+            else:
+                return None
+        self._emit([{'op': 'lease', 'id': task.id, 'leased_by': worker_id,
+                     'lease_expires': task.lease_ts, 'reason': 'claim'}])
+        return task
+    
+    def heartbeat(self, task_id: int, worker_id: str = None,
+                  lease_seconds: int = DEFAULT_LEASE_SECONDS) -> bool:
+        """Extiende la concesión de una tarea reclamada (ver TaskManager.heartbeat)"""
+        worker_id = worker_id or default_worker_id()
+        with self.lock, self.conn:
+            now = time.time()
+            cursor = self.conn.execute(
+                "UPDATE tasks SET lease_expires = ? WHERE id = ? AND completed = 0 "
+                "AND leased_by = ? AND lease_expires > ?",
+                (math.ceil(now + lease_seconds), task_id, worker_id, now)
+            )
+        return cursor.rowcount > 0
+    
+    def release(self, task_id: int, worker_id: str = None) -> bool:
+        """Devuelve a la cola una tarea reclamada sin completarla"""
+        worker_id = worker_id or default_worker_id()
+        with self.lock, self.conn:
+            cursor = self.conn.execute(
+                "UPDATE tasks SET leased_by = NULL, lease_expires = NULL "
+                "WHERE id = ? AND completed = 0 AND leased_by = ?",
+                (task_id, worker_id)
+            )
+        if cursor.rowcount > 0:
+            self._emit([{'op': 'lease', 'id': task_id, 'leased_by': None,
+                         'lease_expires': None, 'reason': 'release'}])
+        return cursor.rowcount > 0
+    
+    def requeue_expired(self, now: float = None) -> List[int]:
+        """Libera las concesiones vencidas (ver TaskManager.requeue_expired)"""
+        now = time.time() if now is None else now
+        requeued = []
+        with self.lock, self.conn:
+            rows = self.conn.execute(
+                "SELECT id FROM tasks WHERE completed = 0 AND leased_by IS NOT NULL AND lease_expires <= ?",
+                (now,)
+            ).fetchall()
+            for row in rows:
+                cursor = self.conn.execute(
+                    "UPDATE tasks SET leased_by = NULL, lease_expires = NULL "
+                    "WHERE id = ? AND completed = 0 AND lease_expires <= ?",
+                    (row['id'], now)
+                )
+                if cursor.rowcount > 0:
+                    requeued.append(row['id'])
+        self._emit([{'op': 'lease', 'id': task_id, 'leased_by': None, 'lease_expires': None,
+                     'reason': 'expired'} for task_id in requeued])
+        return requeued
+    
+    def get_due_tasks(self, now: float = None, limit: int = None) -> List[Task]:
+        """Tareas pendientes ya vencidas, de mayor a menor prioridad"""
+        now = time.time() if now is None else now
+        sql = ("SELECT * FROM tasks WHERE completed = 0 AND due_at <= ? "
+               "ORDER BY priority DESC, due_at, id")
+        if limit:
+            return self._query(sql + " LIMIT ?", (now, limit))
+        return self._query(sql, (now,))
+    
+    def next_due_time(self) -> Optional[int]:
+        """Vencimiento más próximo entre las tareas pendientes (epoch) o None"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT MIN(due_at) AS due FROM tasks WHERE completed = 0 AND due_at IS NOT NULL"
+            ).fetchone()
+        return row['due']
+    
+    def get_task(self, task_id: int) -> Optional[Task]:
+        """Obtiene una tarea por ID"""
+        tasks = self._query("SELECT * FROM tasks WHERE id = ?", (task_id,))
+        return tasks[0] if tasks else None
+    
+    def get_pending_tasks(self) -> List[Task]:
+        """Obtiene todas las tareas pendientes"""
+        return self._query("SELECT * FROM tasks WHERE completed = 0 ORDER BY id")
+    
+    def get_completed_tasks(self) -> List[Task]:
+        """Obtiene todas las tareas completadas"""
+        return self._query("SELECT * FROM tasks WHERE completed = 1 ORDER BY id")
+    
+    def delete_task(self, task_id: int) -> bool:
+        """Elimina una tarea"""
+        with self.lock, self.conn:
+            cursor = self.conn.execute("DELETE FROM tasks WHERE id = ?", (task_id,))
+        if cursor.rowcount > 0:
+            self._emit([{'op': 'delete', 'id': task_id}])
+        return cursor.rowcount > 0
+    
+    def clear_completed(self):
+        """Elimina todas las tareas completadas"""
+        with self.lock, self.conn:
+            ids = [row['id'] for row in self.conn.execute("SELECT id FROM tasks WHERE completed = 1")]
+            self.conn.execute("DELETE FROM tasks WHERE completed = 1")
+        self._emit([{'op': 'clear_completed', 'ids': ids}])
+    
+    def archive_completed(self, archive, older_than=None, keep_last: int = None) -> int:
+        """Mueve tareas completadas al archivo histórico (ver TaskManager.archive_completed)"""
+        with self.lock, self.conn:
+            completed = [self._row_to_task(row) for row in self.conn.execute(
+                "SELECT * FROM tasks WHERE completed = 1 ORDER BY COALESCE(completed_at, created_at), id"
+            )]
+            selected = self._select_for_archive(completed, older_than, keep_last)
+            if not selected:
+                return 0
+            archive.write(selected)
+            ids = [t.id for t in selected]
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                self.conn.execute(
+                    f"DELETE FROM tasks WHERE id IN ({','.join('?' * len(chunk))})", chunk
+                )
+        self._emit([{'op': 'archive', 'ids': ids}])
+        return len(ids)
+    
+    def assign_task(self, task_id: int, agent_name: str) -> bool:
+        """Asigna una tarea a un agente"""
+        with self.lock, self.conn:
+            cursor = self.conn.execute(
+                "UPDATE tasks SET assigned_to = ? WHERE id = ?", (agent_name, task_id)
+            )
+        if cursor.rowcount > 0:
+            self._emit([{'op': 'assign', 'id': task_id, 'agent': agent_name}])
+        return cursor.rowcount > 0
+    
+    def add_tasks(self, descriptions: List[str], agent_name: str = None) -> List[Task]:
+        """Agrega varias tareas en una sola transacción"""
+        tasks = [Task(id=None, description=d, assigned_to=agent_name) for d in descriptions]
+        with self.lock, self.conn:
+            for task in tasks:
+                self._insert(task)
+        self._emit([{'op': 'add', 'task': t.to_row()} for t in tasks])
+        return tasks
+    
+    def complete_tasks(self, task_ids: List[int]) -> List[int]:
+        """Completa varias tareas en una sola transacción"""
+        now = int(time.time())
+        ops = []
+        with self.lock, self.conn:
+            for task_id in task_ids:
+                ops.extend(self._complete(task_id, now))
+        self._emit(ops)
+        return [op['id'] for op in ops if op['op'] == 'complete']
+    
+    def assign_tasks(self, task_ids: List[int], agent_name: str) -> List[int]:
+        """Asigna varias tareas a un agente en una sola transacción"""
+        assigned = []
+        with self.lock, self.conn:
+            for task_id in task_ids:
+                cursor = self.conn.execute(
+                    "UPDATE tasks SET assigned_to = ? WHERE id = ?", (agent_name, task_id)
+                )
+                if cursor.rowcount > 0:
+                    assigned.append(task_id)
+        self._emit([{'op': 'assign', 'id': task_id, 'agent': agent_name} for task_id in assigned])
+        return assigned
+    
+    def get_tasks_by_agent(self, agent_name: str) -> List[Task]:
+        """Obtiene todas las tareas asignadas a un agente"""
+        return self._query("SELECT * FROM tasks WHERE assigned_to = ? ORDER BY id", (agent_name,))
+    
+    def get_agents_with_tasks(self) -> List[str]:
+        """Obtiene lista de agentes que tienen tareas asignadas"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT DISTINCT assigned_to FROM tasks WHERE assigned_to IS NOT NULL ORDER BY assigned_to"
+            ).fetchall()
+        return [row['assigned_to'] for row in rows]
+    
+    def query_tasks(self, status: str = 'all', agent_name: str = None, text: str = None,
+                    after_id: int = 0, limit: int = None) -> List[Task]:
+        """Consulta filtrada y paginada por ID; ver TaskManager.query_tasks"""
+        if status not in TASK_STATUSES:
+            raise ValueError(f"Estado inválido: {status} (usa {', '.join(TASK_STATUSES)})")
+        
+        sql = self.READY_SQL if status == 'ready' else "SELECT * FROM tasks t WHERE 1 = 1"
+        params = []
+        if status in ('pending', 'completed'):
+            sql += " AND t.completed = ?"
+            params.append(1 if status == 'completed' else 0)
+        if agent_name:
+            sql += " AND t.assigned_to = ?"
+            params.append(agent_name)
+        if text:
+            escaped = text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            sql += " AND t.description LIKE ? ESCAPE '\\'"
+            params.append(f"%{escaped}%")
+        sql += " AND t.id > ? ORDER BY t.id"
+        params.append(after_id or 0)
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return self._query(sql, tuple(params))
+    
+    def get_summary(self, agent_name: str = None) -> dict:
+        """Obtiene un resumen de las tareas (de todas o solo las de un agente)"""
+        sql = "SELECT COUNT(*) AS total, COALESCE(SUM(completed), 0) AS completed FROM tasks"
+        params = ()
+        if agent_name:
+            sql += " WHERE assigned_to = ?"
+            params = (agent_name,)
+        with self.lock:
+            row = self.conn.execute(sql, params).fetchone()
+        total, completed = row['total'], row['completed']
+        
+        return {
+            'total': total,
+            'completed': completed,
+            'pending': total - completed,
+            'progress': (completed / total * 100) if total > 0 else 0
+        }
+    
+    def close(self):
+        """Cierra la conexión a la base de datos"""
+        self.conn.close()
+
+
+def create_task_manager(backend: str = None) -> TaskManager:
+    """
+    Crea el gestor de tareas configurado
+    
+    Args:
+        backend: 'json', 'journal' o 'sqlite' (por defecto TASKS_BACKEND, o 'json')
+    """
+    backend = (backend or os.getenv('TASKS_BACKEND', 'json')).lower()
+    # TASKS_EVENT_LOG: ruta del log de eventos, 'on' = junto al store, vacío/'off' = desactivado
+    event_log = os.getenv('TASKS_EVENT_LOG') or None
+    if event_log and event_log.lower() in ('on', 'off'):
+        event_log = event_log.lower() == 'on'
+    
+    if backend == 'sqlite':
+        return SQLiteTaskManager(os.getenv('TASKS_DB', 'tasks.db'), os.getenv('TASKS_FILE', 'tasks.json'),
+                                 event_log=event_log)
+    if backend == 'journal':
+        return JournaledTaskManager(os.getenv('TASKS_FILE', 'tasks.json'), event_log=event_log)
+    return TaskManager(os.getenv('TASKS_FILE', 'tasks.json'), event_log=event_log)
+
+
+# Instancia compartida del gestor de tareas
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_task_manager() -> TaskManager:
+    """
+    Obtiene el gestor de tareas compartido en el proceso
+    
+    Solo vuelve a leer el archivo si otro proceso lo modificó (mtime o tamaño),
+    así las llamadas repetidas a las herramientas no reparsean tasks.json.
+    """
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = create_task_manager()
+        else:
+            _manager.refresh_if_changed()
+        return _manager
+
+
 # Funciones para usar como herramientas del agente
 
-def task_add(description: str) -> dict:
-    """Agrega una nueva tarea"""
-    manager = TaskManager()
-    task = manager.add_task(description)
-    return {
+# Paginación de task_list (mantiene la salida dentro del contexto del modelo)
+TASK_LIST_DEFAULT_LIMIT = 20
+TASK_LIST_MAX_LIMIT = 100
+
+def task_add(description: str, priority: int = 0, due_at=None, recurrence=None,
+             depends_on: List[int] = None) -> dict:
+    """Agrega una nueva tarea (opcionalmente con prioridad, vencimiento, recurrencia y dependencias)"""
+    manager = get_task_manager()
+    try:
+        task = manager.add_task(description, priority=priority, due_at=due_at,
+                                recurrence=recurrence, depends_on=depends_on)
+    except DependencyError as e:
+        return {
+            'success': False,
+            'error': str(e)
+        }
+    except ValueError as e:
+        return {
+            'success': False,
+            'error': f'Programación inválida: {e}'
+        }
+    result = {
         'success': True,
         'task_id': task.id,
         'message': f'Tarea #{task.id} agregada: {description}'
     }
+    if task.due_ts is not None:
+        result['due_at'] = task.due_at
+    return result
 
 
 def task_complete(task_id: int) -> dict:
     """Marca una tarea como completada"""
-    manager = TaskManager()
+    manager = get_task_manager()
     if manager.complete_task(task_id):
         task = manager.get_task(task_id)
         return {
@@ -228,51 +1954,109 @@ def task_complete(task_id: int) -> dict:
     }
 
 
-def task_list(agent_name: str = None) -> dict:
+def task_add_batch(descriptions: List[str], agent_name: str = None) -> dict:
+    """Agrega varias tareas en una sola operación"""
+    descriptions = [d for d in (descriptions or []) if d and d.strip()]
+    if not descriptions:
+        return {
+            'success': False,
+            'error': 'No se proporcionaron descripciones de tareas'
+        }
+    
+    manager = get_task_manager()
+    tasks = manager.add_tasks(descriptions, agent_name=agent_name)
+    return {
+        'success': True,
+        'task_ids': [t.id for t in tasks],
+        'message': f'{len(tasks)} tareas agregadas (#{tasks[0].id}-#{tasks[-1].id})'
+    }
+
+
+def task_complete_batch(task_ids: List[int]) -> dict:
+    """Marca varias tareas como completadas en una sola operación"""
+    manager = get_task_manager()
+    completed = manager.complete_tasks(task_ids or [])
+    skipped = [task_id for task_id in (task_ids or []) if task_id not in completed]
+    if not completed:
+        return {
+            'success': False,
+            'error': f'Ninguna tarea completada (no encontradas o ya completadas: {skipped})'
+        }
+    result = {
+        'success': True,
+        'completed': completed,
+        'message': f'✅ {len(completed)} tareas completadas: {completed}'
+    }
+    if skipped:
+        result['skipped'] = skipped
+    return result
+
+
+def _short(text: str, max_chars: int) -> str:
+    """Recorta una descripción para salidas compactas"""
+    return text if len(text) <= max_chars else text[:max_chars - 1].rstrip() + "…"
+
+
+def task_list(agent_name: str = None, status: str = 'pending', limit: int = 20,
+              cursor: int = None, query: str = None, verbose: bool = False) -> dict:
     """
-    Lista todas las tareas o solo las de un agente específico
+    Lista tareas de forma compacta y paginada
     
     Args:
         agent_name: Nombre del agente (opcional). Si se proporciona, solo muestra sus tareas.
-    """
-    manager = TaskManager()
+        status: 'pending' (default), 'ready', 'completed' o 'all'
+        limit: Máximo de tareas por página (default 20, máximo TASK_LIST_MAX_LIMIT)
+        cursor: next_cursor de la página anterior
+        query: Texto a buscar en la descripción
+        verbose: Descripciones completas y fechas en lugar de la vista compacta
     
-    # Si se especifica un agente, filtrar solo sus tareas
-    if agent_name:
-        all_tasks = manager.get_tasks_by_agent(agent_name)
-        pending = [t for t in all_tasks if not t.completed]
-        completed = [t for t in all_tasks if t.completed]
-        
-        # Calcular resumen solo para este agente
-        total = len(all_tasks)
-        completed_count = len(completed)
-        pending_count = len(pending)
-        progress = (completed_count / total * 100) if total > 0 else 0
-        
-        summary = {
-            'total': total,
-            'completed': completed_count,
-            'pending': pending_count,
-            'progress': progress
+    Returns:
+        dict con la página de tareas, next_cursor (None si no hay más) y el
+        resumen con los conteos totales
+    """
+    manager = get_task_manager()
+    try:
+        limit = max(1, min(int(limit or TASK_LIST_DEFAULT_LIMIT), TASK_LIST_MAX_LIMIT))
+        after_id = int(cursor or 0)
+        # Pedir una tarea de más para saber si hay otra página
+        tasks = manager.query_tasks(status=status or 'pending', agent_name=agent_name,
+                                    text=query, after_id=after_id, limit=limit + 1)
+    except ValueError as e:
+        return {
+            'success': False,
+            'error': str(e)
         }
-    else:
-        # Mostrar todas las tareas
-        pending = manager.get_pending_tasks()
-        completed = manager.get_completed_tasks()
-        summary = manager.get_summary()
+    
+    has_more = len(tasks) > limit
+    tasks = tasks[:limit]
+    
+    items = []
+    for task in tasks:
+        item = {'id': task.id, 'description': task.description if verbose else _short(task.description, 80)}
+        if status == 'all':
+            item['completed'] = task.completed
+        if not agent_name and task.assigned_to:
+            item['assigned_to'] = task.assigned_to
+        if task.depends_on and not task.completed:
+            item['depends_on'] = list(task.depends_on)
+        if verbose:
+            item.update({k: v for k, v in task.to_dict().items()
+                         if v not in (None, [], 0) and k not in item and k != 'completed'})
+        items.append(item)
     
     return {
         'success': True,
-        'pending': [{'id': t.id, 'description': t.description, 'assigned_to': t.assigned_to} for t in pending],
-        'completed': [{'id': t.id, 'description': t.description, 'assigned_to': t.assigned_to} for t in completed],
-        'summary': summary,
+        'status': status,
+        'tasks': items,
+        'next_cursor': tasks[-1].id if has_more else None,
+        'summary': manager.get_summary(agent_name),
         'agent_name': agent_name
     }
 
 
 def task_delete(task_id: int) -> dict:
     """Elimina una tarea"""
-    manager = TaskManager()
+    manager = get_task_manager()
     if manager.delete_task(task_id):
         return {
             'success': True,
@@ -290,7 +2074,7 @@ if __name__ == "__main__":
     print("  DEMO: Sistema de Tareas")
     print("=" * 70)
     
-    manager = TaskManager()
+    manager = get_task_manager()
     
     # Agregar tareas
     print("\n1. Agregando tareas...")
@@ -0,0 +1,188 @@
+"""
+Despachador de tareas programadas
+Entrega automáticamente las tareas vencidas (due_at) a su agente asignado
+
+Las tareas se ordenan por vencimiento y prioridad en el heap del TaskManager;
+el despachador duerme hasta el próximo vencimiento (o poll_interval), o hasta
+que un evento del TaskManager avise de un cambio, y ejecuta cada tarea vencida
+en un hilo del pool. Cada tarea se reclama antes de ejecutarla (con
+heartbeats mientras dura), así varios despachadores o trabajadores pueden
+compartir el mismo store, y en cada vuelta se liberan las concesiones vencidas.
+
+Uso:
+    dispatcher = TaskDispatcher()
+    dispatcher.start()
+    ...
+    dispatcher.stop()
+
+    # o como proceso independiente:
+    python task_scheduler.py
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+from dotenv import load_dotenv
+from task_manager import DEFAULT_LEASE_SECONDS, Task, default_worker_id, get_task_manager
+from task_worker import LeaseHeartbeat, prepare_dspy, run_task
+
+load_dotenv()
+
+
+class TaskDispatcher:
+    """Hilo en segundo plano que entrega las tareas vencidas a sus agentes"""
+
+    def __init__(self, handler: Callable[[Task], object] = None, manager=None,
+                 poll_interval: float = 1.0, max_workers: int = 4, retry_delay: int = 300,
+                 lease_seconds: int = DEFAULT_LEASE_SECONDS, worker_id: str = None):
+        """
+        Args:
+            handler: Función que ejecuta una tarea (por defecto task_worker.run_task)
+            manager: TaskManager a usar (por defecto el compartido del proceso)
+            poll_interval: Espera máxima entre revisiones (segundos)
+            max_workers: Tareas ejecutadas en paralelo
+            retry_delay: Segundos para reprogramar una tarea que quedó sin completar
+            lease_seconds: Duración de la concesión de cada tarea (se renueva con heartbeats)
+            worker_id: Identificador ante otros trabajadores (por defecto host:pid)
+        """
+        self.handler = handler or run_task
+        self.manager = manager
+        self.poll_interval = poll_interval
+        self.max_workers = max_workers
+        self.retry_delay = retry_delay
+        self.lease_seconds = lease_seconds
+        self.worker_id = worker_id or default_worker_id()
+
+        self._in_flight = set()  # (id, vencimiento) de tareas en ejecución
+        self._in_flight_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wakeup = threading.Event()  # Cambios en las tareas: revisar sin esperar
+        self._unsubscribe = None
+        self._thread = None
+        self._executor = None
+        self.stats = {'dispatched': 0, 'completed': 0, 'failed': 0, 'rescheduled': 0}
+
+    def _get_manager(self):
+        return self.manager if self.manager is not None else get_task_manager()
+
+    def start(self):
+        """Inicia el despachador en segundo plano"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        if self.handler is run_task:
+            prepare_dspy()  # dspy.configure solo funciona desde este hilo, no desde el pool
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        # Despertar en cuanto se crea, asigna o reprograma una tarea en este proceso
+        self._unsubscribe = self._get_manager().events.subscribe(
+            lambda event: self._wakeup.set(), types=['created', 'assigned', 'updated', 'completed']
+        )
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+        print(f"⏰ Despachador de tareas iniciado ({self.max_workers} en paralelo)")
+
+    def stop(self, wait: bool = True):
+        """Detiene el despachador (y espera las tareas en curso si wait=True)"""
+        self._stop.set()
+        self._wakeup.set()
+        if self._unsubscribe:
+            self._unsubscribe()
+        if self._thread:
+            self._thread.join()
+        if self._executor:
+            self._executor.shutdown(wait=wait)
+        print(f"⏹️  Despachador detenido: {self.stats}")
+
+    def dispatch_due(self, now: float = None) -> int:
+        """
+        Entrega las tareas vencidas que no estén ya en ejecución (aquí o en otro proceso)
+
+        Returns:
+            Número de tareas entregadas
+        """
+        dispatched = 0
+        manager = self._get_manager()
+        for task in manager.get_due_tasks(now):
+            if not task.assigned_to or not manager.is_ready(task):
+                continue  # Sin agente o con dependencias pendientes: esperar
+            key = (task.id, task.due_ts)
+            with self._in_flight_lock:
+                if key in self._in_flight:
+                    continue
+                self._in_flight.add(key)
+            if not manager.claim_task(task.id, self.worker_id, self.lease_seconds):
+                with self._in_flight_lock:
+                    self._in_flight.discard(key)
+                continue  # La reclamó otro trabajador
+            self.stats['dispatched'] += 1
+            dispatched += 1
+            self._executor.submit(self._run, task, key)
+        return dispatched
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self._get_manager().requeue_expired()
+                self.dispatch_due()
+                next_due = self._get_manager().next_due_time()
+            except Exception as e:
+                print(f"⚠️  Error en el despachador: {e}")
+                next_due = None
+
+            # Solo un vencimiento futuro acorta la espera: las vencidas que no se
+            # pudieron despachar (sin agente, bloqueadas o en curso) esperan a
+            # poll_interval o a un evento, en lugar de revisar en bucle
+            wait = self.poll_interval
+            now = time.time()
+            if next_due is not None and next_due > now:
+                wait = min(wait, next_due - now)
+            self._wakeup.wait(wait)
+            self._wakeup.clear()
+
+    def _run(self, task: Task, key: tuple):
+        """Ejecuta una tarea y la reprograma si no quedó completada"""
+        print(f"▶️  Tarea #{task.id} → {task.assigned_to}: {task.description}")
+        outcome = None
+        manager = self._get_manager()
+        try:
+            with LeaseHeartbeat(manager, task.id, self.worker_id, self.lease_seconds):
+                try:
+                    result = self.handler(task)
+                    if isinstance(result, dict) and result.get('status') == 'error':
+                        outcome = 'failed'
+                        print(f"❌ Tarea #{task.id} falló: {result.get('error')}")
+                except Exception as e:
+                    outcome = 'failed'
+                    print(f"❌ Tarea #{task.id} falló: {e}")
+
+                current = manager.get_task(task.id)
+                if current is None or current.completed:
+                    outcome = 'completed'
+                    print(f"✅ Tarea #{task.id} completada por {task.assigned_to}")
+                elif current.due_ts == task.due_ts:
+                    # El agente no la completó: reintentar más tarde en lugar de en bucle
+                    # (se reprograma antes de liberar la concesión)
+                    manager.schedule_task(task.id, due_at=int(time.time()) + self.retry_delay)
+                    outcome = outcome or 'rescheduled'
+                    print(f"🔁 Tarea #{task.id} sin completar, reprogramada en {self.retry_delay}s")
+        finally:
+            with self._in_flight_lock:
+                self._in_flight.discard(key)
+                if outcome:
+                    self.stats[outcome] += 1
+
+
+if __name__ == "__main__":
+    dispatcher = TaskDispatcher(
+        poll_interval=float(os.getenv('TASKS_POLL_INTERVAL', '1')),
+        max_workers=int(os.getenv('TASKS_MAX_WORKERS', '4')),
+        lease_seconds=int(os.getenv('TASKS_LEASE_SECONDS', str(DEFAULT_LEASE_SECONDS)))
+    )
+    dispatcher.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        dispatcher.stop()
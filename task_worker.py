@@ -0,0 +1,427 @@
+"""
+Pool de trabajadores autónomos para tareas
+Ejecuta sin interacción las tareas pendientes asignadas a agentes, varias en paralelo
+
+Cada tarea se entrega a una instancia nueva de su agente, que trabaja hasta
+llamar a task_complete o hasta agotar el presupuesto (turnos o segundos).
+Solo se ejecutan tareas con sus dependencias (depends_on) completadas; al
+terminar una tarea se lanzan de inmediato las que dependían de ella.
+
+Cada tarea se reclama antes de ejecutarla (claim_task / claim_next) y su
+concesión se renueva con heartbeats mientras el agente trabaja, así varios
+procesos o máquinas sobre el mismo store no ejecutan la misma tarea. Si un
+trabajador se cae, la concesión vence y otro la retoma.
+
+Uso:
+    pool = TaskWorkerPool(workers=4)
+    results = pool.run()
+    pool.print_report(results)
+
+    # o desde la terminal (opcionalmente solo las tareas de un agente):
+    python task_worker.py [nombre_agente]
+    # como servicio que reclama tareas hasta Ctrl+C (uno o varios procesos):
+    python task_worker.py --serve [nombre_agente]
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import List, Optional
+from dotenv import load_dotenv
+from task_manager import DEFAULT_LEASE_SECONDS, Task, default_worker_id, get_task_manager
+
+load_dotenv()
+
+TASK_PROMPT = (
+    "Tu tarea es: {description} (tarea #{id}). Trabaja de forma autónoma, sin hacer "
+    "preguntas al usuario. Cuando termines, márcala como completada con task_complete."
+)
+FOLLOW_UP_PROMPT = (
+    "La tarea #{id} sigue pendiente. Continúa trabajando en ella y llama a "
+    "task_complete(task_id={id}) en cuanto esté terminada."
+)
+
+
+def find_agent_file(agent_name: str, agents_dir: str = "agents") -> Optional[Path]:
+    """Busca el archivo de configuración de un agente guardado por su nombre"""
+    for agent_file in sorted(Path(agents_dir).glob("*.json")):
+        try:
+            with open(agent_file, 'r', encoding='utf-8') as f:
+                if json.load(f).get('name') == agent_name:
+                    return agent_file
+        except (OSError, ValueError):
+            continue
+    return None
+
+
+_tool_executor = None
+_tool_executor_lock = threading.Lock()
+
+
+def prepare_dspy():
+    """
+    Configura DSPy y crea el ToolExecutor compartido por todas las tareas del proceso
+
+    Llamar desde el hilo principal antes de iniciar los hilos de trabajo: DSPy solo
+    acepta dspy.configure desde el hilo que lo configuró. Las llamadas siguientes
+    devuelven el mismo ejecutor.
+    """
+    global _tool_executor
+    with _tool_executor_lock:
+        if _tool_executor is None:
+            import dspy
+            from dspy_agent import DEFAULT_PROGRAM_PATH, ToolExecutor, create_lm
+
+            dspy.configure(lm=create_lm())
+            executor = ToolExecutor()
+            executor.load_compiled(DEFAULT_PROGRAM_PATH)
+            _tool_executor = executor
+        return _tool_executor
+
+
+def load_task_agent(agent_name: str, agents_dir: str = "agents", use_dspy: bool = True):
+    """
+    Carga una instancia nueva del agente con herramientas de tareas
+
+    Cada tarea usa su propia instancia para no mezclar historiales entre hilos;
+    el decisor de herramientas (ToolExecutor) es el compartido de prepare_dspy().
+    """
+    from agent_creator import Agent
+    from dspy_agent import DSPyAgent
+    from tools import create_task_tools
+
+    agent_file = find_agent_file(agent_name, agents_dir)
+    if agent_file is None:
+        raise FileNotFoundError(f"Agente '{agent_name}' no encontrado en {agents_dir}")
+
+    agent = Agent.load_agent(str(agent_file))
+    tool_names = {t.get('function', {}).get('name') for t in agent.get_tools() if t.get('type') == 'function'}
+    if 'task_complete' not in tool_names:
+        agent.tools.extend(t for t in create_task_tools() if t['function']['name'] not in tool_names)
+
+    return DSPyAgent(agent, tool_executor=prepare_dspy()) if use_dspy else agent
+
+
+def run_task(task: Task, agents_dir: str = "agents", max_turns: int = 3,
+             time_budget: float = 300.0, manager=None, use_dspy: bool = True) -> dict:
+    """
+    Ejecuta una tarea con su agente asignado hasta completarla o agotar el presupuesto
+
+    Args:
+        task: Tarea pendiente con assigned_to
+        agents_dir: Directorio de agentes guardados
+        max_turns: Mensajes máximos enviados al agente
+        time_budget: Segundos máximos (se revisa entre turnos)
+        manager: TaskManager (por defecto el compartido del proceso)
+        use_dspy: Envolver el agente con DSPyAgent
+
+    Returns:
+        dict con task_id, agent, status ('completed', 'budget_exhausted' o 'error'),
+        turns, seconds y la última respuesta (o error)
+    """
+    start = time.perf_counter()
+    result = {'task_id': task.id, 'agent': task.assigned_to, 'status': 'budget_exhausted', 'turns': 0}
+
+    try:
+        agent = load_task_agent(task.assigned_to, agents_dir, use_dspy=use_dspy)
+        message = TASK_PROMPT.format(description=task.description, id=task.id)
+
+        while result['turns'] < max_turns and time.perf_counter() - start < time_budget:
+            result['turns'] += 1
+            result['response'] = agent.chat(message)
+
+            current = (manager or get_task_manager()).get_task(task.id)
+            if current is None or current.completed:
+                result['status'] = 'completed'
+                break
+            message = FOLLOW_UP_PROMPT.format(id=task.id)
+    except Exception as e:
+        result['status'] = 'error'
+        result['error'] = str(e)
+
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+
+class LeaseHeartbeat:
+    """
+    Mantiene la concesión de una tarea mientras se ejecuta
+
+    Renueva la concesión cada tercio de lease_seconds y, al salir, la libera
+    si la tarea no quedó completada (vuelve a la cola para otro intento).
+    """
+
+    def __init__(self, manager, task_id: int, worker_id: str, lease_seconds: int = DEFAULT_LEASE_SECONDS):
+        self.manager = manager
+        self.task_id = task_id
+        self.worker_id = worker_id
+        self.lease_seconds = lease_seconds
+        self.lost = False  # Otro trabajador pudo retomar la tarea
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _beat(self):
+        while not self._stop.wait(self.lease_seconds / 3):
+            try:
+                if not self.manager.heartbeat(self.task_id, self.worker_id, self.lease_seconds):
+                    self.lost = True
+                    print(f"⚠️  Tarea #{self.task_id}: se perdió la concesión")
+                    return
+            except Exception as e:
+                print(f"⚠️  Error renovando la concesión de la tarea #{self.task_id}: {e}")
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._beat, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        if not self.lost:
+            self.manager.release(self.task_id, self.worker_id)  # No-op si ya se completó
+        return False
+
+
+class TaskWorkerPool:
+    """Ejecuta en paralelo las tareas pendientes asignadas a agentes"""
+
+    def __init__(self, workers: int = 4, agents_dir: str = "agents", max_turns: int = 3,
+                 time_budget: float = 300.0, manager=None, use_dspy: bool = True,
+                 lease_seconds: int = DEFAULT_LEASE_SECONDS, worker_id: str = None):
+        """
+        Args:
+            workers: Tareas ejecutadas en paralelo
+            agents_dir: Directorio de agentes guardados
+            max_turns: Mensajes máximos por tarea
+            time_budget: Segundos máximos por tarea
+            manager: TaskManager (por defecto el compartido del proceso)
+            use_dspy: Envolver los agentes con DSPyAgent
+            lease_seconds: Duración de la concesión de cada tarea (se renueva con heartbeats)
+            worker_id: Identificador ante otros trabajadores (por defecto host:pid)
+        """
+        self.workers = workers
+        self.agents_dir = agents_dir
+        self.max_turns = max_turns
+        self.time_budget = time_budget
+        self.manager = manager
+        self.use_dspy = use_dspy
+        self.lease_seconds = lease_seconds
+        self.worker_id = worker_id or default_worker_id()
+
+    def _get_manager(self):
+        return self.manager if self.manager is not None else get_task_manager()
+
+    def _runnable(self, task: Task, now: float) -> bool:
+        """
+        Asignada, sin vencimiento futuro y sin reclamar por otro trabajador
+        (las dependencias las filtra get_ready_tasks)
+        """
+        return (bool(task.assigned_to) and (task.due_ts is None or task.due_ts <= now)
+                and not task.is_leased(now))
+
+    def pending_tasks(self, agent_name: str = None, limit: int = None) -> List[Task]:
+        """
+        Tareas listas para ejecutar: pendientes, asignadas, con sus dependencias
+        completadas y sin vencimiento futuro
+
+        Ordenadas por prioridad, luego vencimiento e ID.
+        """
+        now = time.time()
+        tasks = [t for t in self._get_manager().get_ready_tasks(agent_name) if self._runnable(t, now)]
+        tasks.sort(key=lambda t: (-t.priority, t.due_ts if t.due_ts is not None else float('inf'), t.id))
+        return tasks[:limit] if limit else tasks
+
+    def _run_claimed(self, task: Task, retry_delay: int = None) -> dict:
+        """
+        Ejecuta una tarea ya reclamada, renovando su concesión mientras dura
+
+        Con retry_delay, una tarea que quedó sin completar se reprograma para
+        más tarde antes de liberarla (si no, se volvería a reclamar enseguida).
+        """
+        manager = self._get_manager()
+        with LeaseHeartbeat(manager, task.id, self.worker_id, self.lease_seconds) as lease:
+            result = run_task(task, self.agents_dir, self.max_turns, self.time_budget,
+                              self.manager, self.use_dspy)
+            if retry_delay and result['status'] != 'completed' and not lease.lost:
+                manager.schedule_task(task.id, due_at=int(time.time()) + retry_delay)
+        return result
+
+    def run(self, agent_name: str = None, limit: int = None) -> list:
+        """
+        Ejecuta las tareas listas y, a medida que se completan, las que dependían de ellas
+
+        Args:
+            agent_name: Solo tareas de este agente (opcional)
+            limit: Máximo de tareas a ejecutar (opcional)
+
+        Returns:
+            Resultados de run_task, en el orden en que terminaron
+        """
+        tasks = self.pending_tasks(agent_name, limit)
+        if not tasks:
+            print("\n✨ No hay tareas listas asignadas")
+            return []
+
+        if self.use_dspy:
+            prepare_dspy()  # En este hilo, antes de iniciar los trabajadores
+        print(f"\n🚀 Ejecutando tareas con {self.workers} trabajadores...")
+        start = time.perf_counter()
+        manager = self._get_manager()
+        results = []
+        submitted = set()
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            running = set()
+
+            def submit(task):
+                if not manager.claim_task(task.id, self.worker_id, self.lease_seconds):
+                    return  # La reclamó otro trabajador
+                submitted.add(task.id)
+                running.add(executor.submit(self._run_claimed, task))
+
+            for task in tasks:
+                submit(task)
+
+            while running:
+                done, running = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    result = future.result()
+                    results.append(result)
+                    icon = {'completed': '✅', 'budget_exhausted': '⏱️ '}.get(result['status'], '❌')
+                    print(f"{icon} [{len(results)}/{len(submitted)}] Tarea #{result['task_id']} "
+                          f"({result['agent']}): {result['status']} en {result['seconds']:.1f}s, "
+                          f"{result['turns']} turnos")
+
+                    if result['status'] != 'completed':
+                        continue
+                    # Desbloquear las tareas que esperaban a esta
+                    now = time.time()
+                    for dependent in manager.get_dependents(result['task_id']):
+                        if limit and len(submitted) >= limit:
+                            break
+                        if (dependent.id not in submitted and self._runnable(dependent, now)
+                                and (not agent_name or dependent.assigned_to == agent_name)
+                                and manager.is_ready(dependent)):
+                            print(f"🔓 Tarea #{dependent.id} desbloqueada por #{result['task_id']}")
+                            submit(dependent)
+
+        print(f"⏱️  {len(results)} tareas en {time.perf_counter() - start:.1f}s")
+        blocked = [t for t in manager.get_pending_tasks()
+                   if t.depends_on and t.id not in submitted and not manager.is_ready(t)
+                   and (not agent_name or t.assigned_to == agent_name)]
+        if blocked:
+            print(f"⛓️  {len(blocked)} tareas siguen esperando dependencias: "
+                  f"{', '.join(f'#{t.id}' for t in blocked)}")
+        return results
+
+    def serve(self, agent_name: str = None, poll_interval: float = 5.0, retry_delay: int = 300,
+              stop: threading.Event = None) -> list:
+        """
+        Reclama y ejecuta tareas sin parar (modo servicio para varios procesos)
+
+        Cada trabajador toma la siguiente tarea con claim_next; cuando no hay
+        ninguna, libera concesiones vencidas y espera poll_interval.
+
+        Args:
+            agent_name: Solo tareas de este agente (opcional)
+            poll_interval: Espera cuando no hay tareas disponibles
+            retry_delay: Segundos para reintentar una tarea que quedó sin completar
+            stop: Evento para terminar (por defecto hasta Ctrl+C)
+
+        Returns:
+            Resultados de run_task, en el orden en que terminaron
+        """
+        stop = stop or threading.Event()
+        manager = self._get_manager()
+        results = []
+        results_lock = threading.Lock()
+        if self.use_dspy:
+            prepare_dspy()
+
+        def work():
+            while not stop.is_set():
+                try:
+                    task = manager.claim_next(agent_name, self.worker_id, self.lease_seconds)
+                    if task is None:
+                        manager.requeue_expired()
+                        stop.wait(poll_interval)
+                        continue
+                    result = self._run_claimed(task, retry_delay)
+                except Exception as e:
+                    print(f"⚠️  Error en el trabajador: {e}")
+                    stop.wait(poll_interval)
+                    continue
+                with results_lock:
+                    results.append(result)
+                print(f"{'✅' if result['status'] == 'completed' else '⏱️ '} Tarea #{result['task_id']} "
+                      f"({result['agent']}): {result['status']} en {result['seconds']:.1f}s")
+
+        print(f"\n🛰️  {self.worker_id} reclamando tareas con {self.workers} trabajadores (Ctrl+C para salir)...")
+        threads = [threading.Thread(target=work, daemon=True) for _ in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        try:
+            while any(thread.is_alive() for thread in threads):
+                for thread in threads:
+                    thread.join(timeout=0.5)
+        except KeyboardInterrupt:
+            stop.set()
+            print("\n⏹️  Terminando las tareas en curso...")
+            for thread in threads:
+                thread.join()
+        return results
+
+    @staticmethod
+    def summarize(results: list) -> dict:
+        """Conteos por estado y tiempos de las tareas ejecutadas"""
+        seconds = sorted(r['seconds'] for r in results)
+        summary = {
+            'total': len(results),
+            'completed': sum(1 for r in results if r['status'] == 'completed'),
+            'budget_exhausted': sum(1 for r in results if r['status'] == 'budget_exhausted'),
+            'errors': sum(1 for r in results if r['status'] == 'error'),
+            'total_seconds': sum(seconds),
+            'avg_seconds': sum(seconds) / len(seconds) if seconds else 0,
+            'max_seconds': seconds[-1] if seconds else 0
+        }
+        return summary
+
+    def print_report(self, results: list):
+        """Imprime el resumen de la ejecución y los errores"""
+        summary = self.summarize(results)
+        print("\n" + "=" * 70)
+        print("  RESULTADOS DE TAREAS AUTÓNOMAS")
+        print("=" * 70)
+        print(f"Total: {summary['total']} | Completadas: {summary['completed']} | "
+              f"Sin terminar: {summary['budget_exhausted']} | Errores: {summary['errors']}")
+        print(f"Tiempo por tarea: promedio {summary['avg_seconds']:.1f}s | "
+              f"máximo {summary['max_seconds']:.1f}s | suma {summary['total_seconds']:.1f}s")
+
+        for result in sorted(results, key=lambda r: r['task_id']):
+            if result['status'] == 'error':
+                print(f"   ❌ Tarea #{result['task_id']}: {result['error']}")
+        print("=" * 70)
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    serve = '--serve' in args
+    args = [arg for arg in args if arg != '--serve']
+    pool = TaskWorkerPool(
+        workers=int(os.getenv('TASKS_MAX_WORKERS', '4')),
+        max_turns=int(os.getenv('TASKS_MAX_TURNS', '3')),
+        time_budget=float(os.getenv('TASKS_TIME_BUDGET', '300')),
+        lease_seconds=int(os.getenv('TASKS_LEASE_SECONDS', str(DEFAULT_LEASE_SECONDS)))
+    )
+    agent_name = args[0] if args else None
+    if serve:
+        results = pool.serve(agent_name=agent_name, poll_interval=float(os.getenv('TASKS_POLL_INTERVAL', '5')))
+    else:
+        results = pool.run(agent_name=agent_name)
+    if results:
+        pool.print_report(results)
@@ -0,0 +1,293 @@
+"""
+Pruebas de los gestores de tareas (json, journal y sqlite)
+
+Ejecutar: python -m pytest -q tests
+"""
+
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from task_manager import DependencyError, JournaledTaskManager, SQLiteTaskManager, TaskManager
+
+
+@pytest.fixture(params=['json', 'journal', 'sqlite'])
+def manager(request, tmp_path):
+    """Un gestor nuevo de cada backend en un directorio temporal"""
+    if request.param == 'sqlite':
+        m = SQLiteTaskManager(str(tmp_path / "tasks.db"), str(tmp_path / "tasks.json"))
+        yield m
+        m.close()
+    elif request.param == 'journal':
+        yield JournaledTaskManager(str(tmp_path / "tasks.json"))
+    else:
+        yield TaskManager(str(tmp_path / "tasks.json"))
+
+
+# --- Recurrencia ---
+
+def test_recurring_completed_early_moves_forward(manager):
+    """Completar antes de vencer programa la siguiente una recurrencia después"""
+    due = int(time.time()) + 3600
+    task = manager.add_task("informe", due_at=due, recurrence='1d')
+    assert manager.complete_task(task.id)
+
+    pending = manager.get_pending_tasks()
+    assert len(pending) == 1
+    assert pending[0].id != task.id
+    assert pending[0].due_ts == due + 86400
+
+
+def test_recurring_overdue_catches_up(manager):
+    """Una tarea atrasada salta al próximo vencimiento futuro, sin acumular repeticiones"""
+    now = int(time.time())
+    task = manager.add_task("backup", due_at=now - 3 * 3600 - 60, recurrence='1h')
+    assert manager.complete_task(task.id)
+
+    pending = manager.get_pending_tasks()
+    assert len(pending) == 1
+    assert now < pending[0].due_ts <= now + 3600
+
+
+# --- Migración a SQLite ---
+
+MIGRATE_SCRIPT = (
+    "import sys; from task_manager import SQLiteTaskManager; "
+    "m = SQLiteTaskManager(sys.argv[1], sys.argv[2]); "
+    "print(len(m.tasks)); m.close()"
+)
+
+
+def _legacy_json(tmp_path, count=50):
+    json_file = tmp_path / "tasks.json"
+    legacy = TaskManager(str(json_file))
+    for i in range(count):
+        legacy.add_task(f"tarea {i}")
+    return json_file
+
+
+def test_sqlite_migration_runs_once(tmp_path):
+    """Abrir la base varias veces no vuelve a importar tasks.json"""
+    json_file = _legacy_json(tmp_path)
+    db_file = str(tmp_path / "tasks.db")
+
+    m = SQLiteTaskManager(db_file, str(json_file))
+    assert len(m.tasks) == 50
+    assert m.migrate_from_json(str(json_file)) == 0
+    m.close()
+
+    m = SQLiteTaskManager(db_file, str(json_file))
+    assert len(m.tasks) == 50
+    assert m.add_task("nueva").id == 51
+    m.close()
+
+
+def test_sqlite_migration_concurrent_processes(tmp_path):
+    """Varios procesos que arrancan a la vez importan tasks.json una sola vez"""
+    json_file = _legacy_json(tmp_path)
+    db_file = str(tmp_path / "tasks.db")
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = {**os.environ, 'PYTHONPATH': os.pathsep.join(filter(None, [root, os.getenv('PYTHONPATH')]))}
+
+    procs = [
+        subprocess.Popen([sys.executable, "-c", MIGRATE_SCRIPT, db_file, str(json_file)],
+                         stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, env=env)
+        for _ in range(4)
+    ]
+    for proc in procs:
+        out, err = proc.communicate(timeout=60)
+        assert proc.returncode == 0, err
+        assert out.strip().splitlines()[-1] == "50"
+
+
+# --- Concesiones (leases) ---
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Reloj controlado: clock[0] es el time.time() actual"""
+    now = [1_700_000_000.0]
+    monkeypatch.setattr(time, 'time', lambda: now[0])
+    return now
+
+
+def test_lease_blocks_other_workers(manager, clock):
+    task = manager.add_tasks(["scrapear"], agent_name="bot")[0]
+
+    claimed = manager.claim_next("bot", "w1", lease_seconds=60)
+    assert claimed.id == task.id
+    assert manager.claim_next("bot", "w2", lease_seconds=60) is None
+    assert not manager.claim_task(task.id, "w2", lease_seconds=60)
+    assert manager.get_task(task.id).leased_by == "w1"
+
+
+def test_expired_lease_is_reclaimed(manager, clock):
+    task = manager.add_tasks(["scrapear"], agent_name="bot")[0]
+    assert manager.claim_task(task.id, "w1", lease_seconds=60)
+
+    clock[0] += 30
+    assert manager.heartbeat(task.id, "w1", lease_seconds=60)
+    clock[0] += 40
+    assert manager.claim_next("bot", "w2", lease_seconds=60) is None  # El heartbeat la extendió
+
+    clock[0] += 60
+    assert not manager.heartbeat(task.id, "w1", lease_seconds=60)
+    assert manager.claim_next("bot", "w2", lease_seconds=60).id == task.id
+    assert manager.get_task(task.id).leased_by == "w2"
+
+
+def test_requeue_expired_releases_leases(manager, clock):
+    first, second = manager.add_tasks(["a", "b"], agent_name="bot")
+    assert manager.claim_task(first.id, "w1", lease_seconds=60)
+    assert manager.claim_task(second.id, "w1", lease_seconds=600)
+
+    requeued = []
+    manager.events.subscribe(lambda e: requeued.append(e['task_id']), types=['requeued'])
+    clock[0] += 120
+    assert manager.requeue_expired() == [first.id]
+    assert requeued == [first.id]
+
+    task = manager.get_task(first.id)
+    assert task.leased_by is None and task.lease_ts is None
+    assert manager.get_task(second.id).leased_by == "w1"
+    assert manager.requeue_expired() == []
+
+
+def test_release_and_complete_clear_lease(manager, clock):
+    first, second = manager.add_tasks(["a", "b"], agent_name="bot")
+    assert manager.claim_task(first.id, "w1")
+    assert not manager.release(first.id, "w2")  # Solo quien la reclamó
+    assert manager.release(first.id, "w1")
+    assert manager.claim_task(first.id, "w2")
+
+    assert manager.claim_task(second.id, "w1")
+    assert manager.complete_task(second.id)
+    assert manager.get_task(second.id).leased_by is None
+    assert manager.claim_task(second.id, "w2") is False
+
+
+# --- Log del backend journal ---
+
+def _state(manager):
+    """Estado comparable: (id, descripción, completada, agente, prioridad) y next_id"""
+    rows = sorted((t.id, t.description, t.completed, t.assigned_to, t.priority) for t in manager.tasks)
+    return rows, manager.next_id
+
+
+def _fill_journal(manager):
+    tasks = manager.add_tasks([f"tarea {i}" for i in range(20)], agent_name="bot")
+    manager.complete_task(tasks[0].id)
+    manager.delete_task(tasks[1].id)
+    manager.schedule_task(tasks[2].id, priority=5)
+    manager.assign_task(tasks[3].id, "otro")
+    return tasks
+
+
+def test_journal_rebuilds_after_compaction(tmp_path):
+    tasks_file = str(tmp_path / "tasks.json")
+    manager = JournaledTaskManager(tasks_file, compact_threshold=10 ** 9)
+    _fill_journal(manager)
+    manager.compact()
+    assert not manager.journal_file.exists()
+
+    # Operaciones posteriores quedan solo en el log nuevo
+    manager.complete_task(5)
+    manager.add_task("después de compactar")
+    assert manager.journal_file.exists()
+
+    reloaded = JournaledTaskManager(tasks_file, compact_threshold=10 ** 9)
+    assert _state(reloaded) == _state(manager)
+    assert reloaded.add_task("nueva").id == manager.next_id
+
+
+def test_journal_background_compaction(tmp_path):
+    tasks_file = str(tmp_path / "tasks.json")
+    manager = JournaledTaskManager(tasks_file, compact_threshold=2048)
+    _fill_journal(manager)
+    for i in range(50):
+        manager.add_task(f"extra {i}")
+    assert manager._compactor is not None  # El log superó el umbral
+    manager._compactor.join(timeout=10)
+
+    reloaded = JournaledTaskManager(tasks_file)
+    assert _state(reloaded) == _state(manager)
+
+
+def test_journal_replays_interrupted_compaction(tmp_path):
+    """Si el proceso muere con el log renombrado, se reaplica al cargar"""
+    tasks_file = str(tmp_path / "tasks.json")
+    manager = JournaledTaskManager(tasks_file, compact_threshold=10 ** 9)
+    _fill_journal(manager)
+    os.replace(manager.journal_file, manager.compacting_file)  # Compactación sin terminar
+
+    reloaded = JournaledTaskManager(tasks_file, compact_threshold=10 ** 9)
+    assert _state(reloaded) == _state(manager)
+    reloaded.compact()
+    assert not reloaded.compacting_file.exists()
+    assert _state(JournaledTaskManager(tasks_file)) == _state(manager)
+
+
+# --- Dependencias ---
+
+def test_dependencies_gate_ready_tasks(manager):
+    a = manager.add_task("descargar")
+    b = manager.add_task("procesar", depends_on=[a.id])
+    c = manager.add_task("publicar", depends_on=[a.id, b.id])
+
+    assert [t.id for t in manager.get_ready_tasks()] == [a.id]
+    assert sorted(t.id for t in manager.get_dependents(a.id)) == [b.id, c.id]
+
+    manager.complete_task(a.id)
+    assert [t.id for t in manager.get_ready_tasks()] == [b.id]
+    manager.complete_task(b.id)
+    assert [t.id for t in manager.get_ready_tasks()] == [c.id]
+
+
+def test_dependencies_reject_cycles_and_missing(manager):
+    a = manager.add_task("a")
+    b = manager.add_task("b", depends_on=[a.id])
+
+    with pytest.raises(DependencyError):
+        manager.set_dependencies(a.id, [b.id])
+    with pytest.raises(DependencyError):
+        manager.add_task("c", depends_on=[999])
+    assert not manager.get_task(a.id).depends_on
+
+
+# --- Consultas e índices ---
+
+def test_query_tasks_pages_and_filters(manager):
+    tasks = manager.add_tasks([f"informe {i}" for i in range(7)], agent_name="bot")
+    manager.add_tasks(["otra cosa"], agent_name="otro")
+    manager.complete_task(tasks[0].id)
+
+    pages, after_id = [], 0
+    while True:
+        page = manager.query_tasks('pending', agent_name="bot", after_id=after_id, limit=3)
+        if not page:
+            break
+        pages.append([t.id for t in page])
+        after_id = page[-1].id
+    assert pages == [[t.id for t in tasks[1:4]], [t.id for t in tasks[4:7]]]
+
+    assert [t.id for t in manager.query_tasks('completed')] == [tasks[0].id]
+    assert len(manager.query_tasks(text="INFORME")) == 7
+    with pytest.raises(ValueError):
+        manager.query_tasks('desconocido')
+
+
+def test_indexes_follow_updates(manager):
+    a, b = manager.add_tasks(["a", "b"], agent_name="bot")
+    manager.assign_task(b.id, "otro")
+    manager.complete_task(a.id)
+    manager.delete_task(b.id)
+
+    assert manager.get_task(b.id) is None
+    assert [t.id for t in manager.get_completed_tasks()] == [a.id]
+    assert manager.get_pending_tasks() == []
+    assert manager.get_tasks_by_agent("otro") == []
+    assert [t.id for t in manager.get_tasks_by_agent("bot")] == [a.id]
@@ -244,6 +244,8 @@ def create_task_tools() -> list:
         - task_complete: Marcar tarea como completada
         - task_list: Listar todas las tareas
         - task_delete: Eliminar una tarea
+        - task_add_batch: Agregar varias tareas en una sola llamada
+        - task_complete_batch: Completar varias tareas en una sola llamada
     """
     return [
         {
@@ -257,6 +259,23 @@ def create_task_tools() -> list:
                         'description': {
                             'type': 'string',
                             'description': 'Descripción de la tarea'
+                        },
+                        'priority': {
+                            'type': 'integer',
+                            'description': 'Prioridad (mayor número = más urgente, por defecto 0)'
+                        },
+                        'due_at': {
+                            'type': 'string',
+                            'description': 'Vencimiento en ISO (2025-01-31T09:00) o relativo (+30m, +2h, +1d)'
+                        },
+                        'recurrence': {
+                            'type': 'string',
+                            'description': 'Repetición: 30m, 1h, 1d, 1w, hourly, daily o weekly'
+                        },
+                        'depends_on': {
+                            'type': 'array',
+                            'items': {'type': 'integer'},
+                            'description': 'IDs de tareas que deben completarse antes de esta'
                         }
                     },
                     'required': ['description']
@@ -284,10 +303,32 @@ def create_task_tools() -> list:
             'type': 'function',
             'function': {
                 'name': 'task_list',
-                'description': 'Lista SOLO TUS tareas asignadas (pendientes y completadas). ÚSALA PRIMERO cuando el usuario diga "realiza tus tareas", "qué tareas tienes", "tienes tareas pendientes" o similar. Automáticamente filtra solo las tareas asignadas a ti.',
+                'description': 'Lista SOLO TUS tareas asignadas. ÚSALA PRIMERO cuando el usuario diga "realiza tus tareas", "qué tareas tienes", "tienes tareas pendientes" o similar. Automáticamente filtra solo las tareas asignadas a ti. Por defecto devuelve tus tareas pendientes (máx. 20, descripciones cortas) y un resumen con los totales; usa next_cursor para ver más.',
                 'parameters': {
                     'type': 'object',
-                    'properties': {},
+                    'properties': {
+                        'status': {
+                            'type': 'string',
+                            'enum': ['pending', 'ready', 'completed', 'all'],
+                            'description': 'Qué tareas listar (default: pending; ready = pendientes sin dependencias por cumplir)'
+                        },
+                        'limit': {
+                            'type': 'integer',
+                            'description': 'Máximo de tareas a devolver (default 20, máximo 100)'
+                        },
+                        'cursor': {
+                            'type': 'integer',
+                            'description': 'Valor next_cursor de la respuesta anterior para ver la siguiente página'
+                        },
+                        'query': {
+                            'type': 'string',
+                            'description': 'Texto a buscar en la descripción de las tareas'
+                        },
+                        'verbose': {
+                            'type': 'boolean',
+                            'description': 'Descripciones completas y detalles (prioridad, vencimiento)'
+                        }
+                    },
                     'required': []
                 }
             }
@@ -308,6 +349,42 @@ def create_task_tools() -> list:
                     'required': ['task_id']
                 }
             }
+        },
+        {
+            'type': 'function',
+            'function': {
+                'name': 'task_add_batch',
+                'description': 'Agrega varias tareas de una vez. Úsala en lugar de llamar task_add repetidamente cuando planifiques varias subtareas.',
+                'parameters': {
+                    'type': 'object',
+                    'properties': {
+                        'descriptions': {
+                            'type': 'array',
+                            'items': {'type': 'string'},
+                            'description': 'Descripciones de las tareas, una por elemento'
+                        }
+                    },
+                    'required': ['descriptions']
+                }
+            }
+        },
+        {
+            'type': 'function',
+            'function': {
+                'name': 'task_complete_batch',
+                'description': 'Marca varias tareas como completadas de una vez. Úsala cuando termines varias tareas.',
+                'parameters': {
+                    'type': 'object',
+                    'properties': {
+                        'task_ids': {
+                            'type': 'array',
+                            'items': {'type': 'integer'},
+                            'description': 'IDs de las tareas a completar'
+                        }
+                    },
+                    'required': ['task_ids']
+                }
+            }
         }
     ]
 
@@ -94,6 +94,37 @@ class DotLoader:
         sys.stdout.flush()
 
 
+class RateLimiter:
+    """
+    Limitador de peticiones (token bucket) seguro entre hilos
+    
+    Uso:
+        limiter = RateLimiter(requests_per_second=5)
+        limiter.acquire()  # Bloquea hasta que haya cupo
+        # ... llamar a la API ...
+    """
+    
+    def __init__(self, requests_per_second: float, burst: int = 1):
+        self.rate = requests_per_second
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+    
+    def acquire(self):
+        """Espera hasta obtener un permiso para hacer una petición"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+                self.last = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
 def format_message(role: str, content: str, max_length: int = None) -> str:
     """
     Formatea un mensaje para mostrar en consola